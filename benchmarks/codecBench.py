@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import random
+import time
+from collections.abc import Callable
+from typing import Any
+
+from service.codec import MsgpackCodec, debugView, jsonEncoder, playerCodec, resultsCodec, trackCodec
+from service.gachaLogic import GachaService
+
+from msgspec import json as mscjson
+
+
+def _timeit(func: Callable[[], Any], repeat: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter_ns() - start) / repeat / 1e3
+
+
+async def _buildPlayer(pulls: int, seed: int) -> GachaService:
+    tester = GachaService(showLog=False, rng=random.Random(seed))
+    for poolId in ("SINGLE_45_0_7", "LIMITED_47_0_1", "CLASSIC_48_0_1"):
+        for _ in range(pulls // 10):
+            for bundle in await tester.handleTenAdvancedGacha(poolId):
+                tester.track.pool[poolId].history.record(bundle.id_, bundle.rarity)
+    return tester
+
+
+def run(pulls: int, seed: int, repeat: int) -> dict[str, dict[str, float]]:
+    tester = asyncio.run(_buildPlayer(pulls, seed))
+    results = list(asyncio.run(tester.handleTenAdvancedGacha("SINGLE_45_0_7")))
+    buffer = bytearray(65536)
+
+    return {
+        "player": _measure(tester.data, playerCodec, buffer, repeat),
+        "track": _measure(tester.track, trackCodec, buffer, repeat),
+        "tenPullResults": _measure(results, resultsCodec, buffer, repeat),
+    }
+
+
+def _measure[T](obj: T, codec: MsgpackCodec[T], buffer: bytearray, repeat: int) -> dict[str, float]:
+    jsonPayload = jsonEncoder.encode(obj)
+    msgpackPayload = codec.encode(obj)
+    assert codec.decode(msgpackPayload) is not None
+    return {
+        "jsonBytes": len(jsonPayload),
+        "msgpackBytes": len(msgpackPayload),
+        # 原调试路径: encode -> decode -> 缩进输出
+        "debugRoundTripUs": _timeit(lambda: debugView(mscjson.decode(jsonEncoder.encode(obj))), repeat),
+        "jsonEncodeUs": _timeit(lambda: jsonEncoder.encode(obj), repeat),
+        "msgpackEncodeUs": _timeit(lambda: codec.encode(obj), repeat),
+        "msgpackEncodeIntoUs": _timeit(lambda: codec.encodeInto(obj, buffer), repeat),
+        "msgpackDecodeUs": _timeit(lambda: codec.decode(msgpackPayload), repeat),
+    }
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Compare JSON and msgpack encoding of player state")
+    parser.add_argument("--pulls", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+    print(mscjson.format(mscjson.encode(run(args.pulls, args.seed, args.repeat))).decode())
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,129 @@
+import argparse
+import math
+import random
+import sys
+import time
+
+from service.poolGenerator import CompiledPoolGroup
+from service.tableRegistry import GachaTableRegistry
+
+from msgspec import Struct, json as mscjson
+import numpy as np
+
+
+class GroupCheck(Struct):
+    poolId: str
+    rarity: int
+    chars: int
+    maxTableError: float
+    chiSquare: dict[str, float]
+    critical: float
+    passed: bool
+
+
+class SamplerReport(Struct):
+    seed: int
+    samples: int
+    alpha: float
+    aliasNs: float
+    choicesNs: float
+    groups: list[GroupCheck]
+    passed: bool
+
+
+class SamplerCheck:
+    # 以卡方拟合优度检验别名表取样与 random.choices 是否都符合卡池权重; 仓库没有单元测试, 以脚本形式运行
+    POOLS: tuple[str, ...] = ("SINGLE_45_0_7", "LIMITED_47_0_1", "LINKAGE_48_0_3", "CLASSIC_48_0_1", "BOOT_0_1_2")
+    # 标准正态分布在 alpha = 1e-6 时的上分位数
+    Z_SCORE: float = 4.753424
+
+    def __init__(self, seed: int = 0, samples: int = 200000) -> None:
+        self.seed: int = seed
+        self.samples: int = samples
+        self.tables: GachaTableRegistry = GachaTableRegistry.shared()
+
+    def run(self) -> SamplerReport:
+        groups: list[GroupCheck] = []
+        for poolId in self.POOLS:
+            compiled = self.tables.pools.get(poolId)
+            for rarity, group in enumerate(compiled.groups):
+                if group is not None and len(group.items) > 1:
+                    groups.append(self.checkGroup(poolId, rarity, group))
+
+        group = max((g for g in self.tables.pools.get(self.POOLS[0]).groups if g), key=lambda g: len(g.items))
+        return SamplerReport(
+            seed=self.seed,
+            samples=self.samples,
+            alpha=1e-6,
+            aliasNs=self._timeit(lambda rng: group.table.sample(rng)),
+            choicesNs=self._timeit(lambda rng: rng.choices(range(len(group.weights)), weights=group.weights, k=1)),
+            groups=groups,
+            passed=all(g.passed for g in groups),
+        )
+
+    def checkGroup(self, poolId: str, rarity: int, group: CompiledPoolGroup) -> GroupCheck:
+        total = sum(group.weights)
+        expected = [w / total for w in group.weights]
+        tableError = max(abs(a - b) for a, b in zip(group.table.probabilities(), expected))
+
+        n = len(expected)
+        rng = random.Random(f"{self.seed}:{poolId}:{rarity}")
+        counts = {
+            "alias": self._count((group.table.sample(rng) for _ in range(self.samples)), n),
+            "choices": self._count(rng.choices(range(n), weights=group.weights, k=self.samples), n),
+            "aliasNumpy": np.bincount(
+                group.table.sampleMany(np.random.default_rng(rng.getrandbits(64)), self.samples), minlength=n
+            ).tolist(),
+        }
+        chiSquare = {name: self._chiSquare(c, expected) for name, c in counts.items()}
+        critical = self._critical(n - 1)
+        return GroupCheck(
+            poolId=poolId,
+            rarity=rarity,
+            chars=n,
+            maxTableError=tableError,
+            chiSquare=chiSquare,
+            critical=critical,
+            passed=tableError < 1e-9 and all(x < critical for x in chiSquare.values()),
+        )
+
+    @staticmethod
+    def _count(indices, n: int) -> list[int]:
+        counts = [0] * n
+        for i in indices:
+            counts[i] += 1
+        return counts
+
+    def _chiSquare(self, counts: list[int], expected: list[float]) -> float:
+        return sum((c - p * self.samples) ** 2 / (p * self.samples) for c, p in zip(counts, expected) if p)
+
+    def _critical(self, df: int) -> float:
+        # Wilson-Hilferty 近似的卡方分布上分位数
+        h = 2 / (9 * df)
+        return df * (1 - h + self.Z_SCORE * math.sqrt(h)) ** 3
+
+    def _timeit(self, func) -> float:
+        rng = random.Random(self.seed)
+        loops = 100000
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            func(rng)
+        return (time.perf_counter_ns() - start) / loops
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Check alias-table sampling against the pool weights")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samples", type=int, default=200000)
+    args = parser.parse_args()
+
+    report = SamplerCheck(args.seed, args.samples).run()
+    print(mscjson.format(mscjson.encode(report)).decode())
+    if not report.passed:
+        failed = [f"{g.poolId}[{g.rarity}]" for g in report.groups if not g.passed]
+        print(f"sampler check failed for {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    _main()
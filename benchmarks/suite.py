@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+
+from service.codec import MsgpackCodec, jsonEncoder, playerCodec, trackCodec
+from service.gachaLogic import GachaService
+from service.models import RuleType
+from service.poolGenerator import PoolGenerator
+from service.tableArtifact import buildArtifact
+from service.tableRegistry import GachaTableRegistry
+
+from msgspec import Struct, json as mscjson
+
+
+class BenchResult(Struct):
+    value: float
+    unit: str
+    higherIsBetter: bool = False
+
+
+class BenchReport(Struct):
+    seed: int
+    python: str
+    results: dict[str, BenchResult]
+
+
+class BenchmarkSuite:
+    # 固定种子, 各卡池类型取详情表中最新的卡池, 结果可跨提交比较
+    HISTORY_SIZES: tuple[int, ...] = (0, 1000, 100000)
+    NEWBEE_POOL: str = "BOOT_0_1_2"
+    TEN_PULL_POOL: str = "SINGLE_45_0_7"
+
+    def __init__(self, seed: int = 0, pulls: int = 2000, repeat: int = 5) -> None:
+        self.seed: int = seed
+        self.pulls: int = pulls
+        self.repeat: int = repeat
+        self.tables: GachaTableRegistry = GachaTableRegistry.shared()
+        self.results: dict[str, BenchResult] = {}
+
+    def poolsByRuleType(self) -> dict[str, str]:
+        pools: dict[str, str] = {}
+        for poolClient in self.tables.Excel.gachaPoolClient:
+            if poolClient.gachaPoolId in self.tables.Server.details:
+                pools[poolClient.gachaRuleType] = poolClient.gachaPoolId
+        pools[RuleType.NEWBEE] = self.NEWBEE_POOL
+        return dict(sorted(pools.items()))
+
+    def newService(self, salt: str = "") -> GachaService:
+        return GachaService(showLog=False, tables=self.tables, rng=random.Random(f"{self.seed}:{salt}"))
+
+    def add(self, name: str, value: float, unit: str, higherIsBetter: bool = False) -> None:
+        self.results[name] = BenchResult(value=round(value, 3), unit=unit, higherIsBetter=higherIsBetter)
+
+    async def run(self) -> BenchReport:
+        self.benchColdStart()
+        await self.benchSinglePull()
+        await self.benchTenPull()
+        await self.benchPoolBuild()
+        await self.benchSerialization()
+        self.benchAllocation()
+        return BenchReport(seed=self.seed, python=sys.version.split()[0], results=self.results)
+
+    def benchColdStart(self) -> None:
+        samples = [GachaTableRegistry.load().decodeTime * 1e3 for _ in range(self.repeat)]
+        self.add("coldStart.decodeMs", min(samples), "ms")
+
+        # 预处理文件: 包含读取、校验与已编译卡池的重建, 与 JSON 解码后全部编译对比
+        excelPath, serverPath = GachaTableRegistry.excelPath, GachaTableRegistry.serverPath
+        with tempfile.TemporaryDirectory() as tmp:
+            artifactPath = Path(tmp) / "gacha_tables.msgpack"
+            artifactPath.write_bytes(buildArtifact(excelPath, serverPath))
+            self.add("coldStart.artifactMs", self._timeMs(lambda: GachaTableRegistry.load(artifactPath=artifactPath)), "ms")
+        self.add("coldStart.jsonCompiledMs", self._timeMs(lambda: GachaTableRegistry.load().pools.warm()), "ms")
+
+        # 按需解码: 启动时只切分各卡池的原始片段
+        samples = [GachaTableRegistry.load(lazy=True).decodeTime * 1e3 for _ in range(self.repeat)]
+        self.add("coldStart.lazyDecodeMs", min(samples), "ms")
+        self.add("coldStart.residentKiB", GachaTableRegistry.load(lazy=False).residentSize / 1024, "KiB")
+        self.add("coldStart.lazyResidentKiB", GachaTableRegistry.load(lazy=True).residentSize / 1024, "KiB")
+
+    async def benchSinglePull(self) -> None:
+        for ruleType, poolId in self.poolsByRuleType().items():
+            service = self.newService(poolId)
+            await service.drawMany(poolId, 1)
+            samples = []
+            for _ in range(self.pulls):
+                start = time.perf_counter_ns()
+                await service.drawMany(poolId, 1)
+                samples.append(time.perf_counter_ns() - start)
+            samples.sort()
+            self.add(f"singlePull.{ruleType}.p50Us", samples[len(samples) // 2] / 1e3, "us")
+            self.add(f"singlePull.{ruleType}.p99Us", samples[int(len(samples) * 0.99)] / 1e3, "us")
+
+    async def benchTenPull(self) -> None:
+        service = self.newService("ten")
+        batches = max(self.pulls // 10, 1)
+        await service.handleTenAdvancedGacha(self.TEN_PULL_POOL)
+
+        async def tenPulls() -> None:
+            for _ in range(batches):
+                await service.handleTenAdvancedGacha(self.TEN_PULL_POOL)
+
+        elapsed = await self._best(tenPulls)
+        self.add(f"tenPull.{self.TEN_PULL_POOL}.pullsPerSec", batches * 10 / elapsed, "pulls/s", True)
+
+    async def benchPoolBuild(self) -> None:
+        for ruleType, poolId in self.poolsByRuleType().items():
+            detail = self.tables.Server.details[poolId]
+            elapsed = await self._best(self._sync(lambda: PoolGenerator.compile(detail)), loops=100)
+            self.add(f"poolBuild.{poolId}.us", elapsed * 1e6, "us")
+
+    async def benchSerialization(self) -> None:
+        for size in self.HISTORY_SIZES:
+            service = self.newService(f"history{size}")
+            result = await service.drawMany(self.TEN_PULL_POOL, size)
+            state = service.track.pool[self.TEN_PULL_POOL]
+            for charHit in result:
+                state.history.record(charHit.id_, charHit.rarity)
+
+            loops = max(100000 // max(size, 100), 1)
+            await self._benchCodec(f"serialize.player.{size}", service.data, playerCodec, loops)
+            await self._benchCodec(f"serialize.track.{size}", service.track, trackCodec, loops)
+
+    async def _benchCodec[T](self, prefix: str, obj: T, codec: MsgpackCodec[T], loops: int) -> None:
+        jsonElapsed = await self._best(self._sync(lambda: jsonEncoder.encode(obj)), loops)
+        msgpackElapsed = await self._best(self._sync(lambda: codec.encode(obj)), loops)
+        self.add(f"{prefix}.jsonUs", jsonElapsed * 1e6, "us")
+        self.add(f"{prefix}.msgpackUs", msgpackElapsed * 1e6, "us")
+        self.add(f"{prefix}.msgpackBytes", len(codec.encode(obj)), "bytes")
+
+    def benchAllocation(self) -> None:
+        # 十连一次的临时内存分配峰值, 反映每次抽卡新建对象的数量; 开启 tracemalloc 会拖慢执行, 放在计时项之后
+        for ruleType, poolId in self.poolsByRuleType().items():
+            service = self.newService(f"alloc{poolId}")
+            service.draw(poolId, 10)
+            tracemalloc.start()
+            service.draw(poolId, 10)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.add(f"allocation.{ruleType}.tenPullPeakKiB", peak / 1024, "KiB")
+
+    def _timeMs(self, func: Callable[[], Any]) -> float:
+        samples = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1e3)
+        return min(samples)
+
+    @staticmethod
+    def _sync(func: Callable[[], Any]) -> Callable[[], Awaitable[None]]:
+        async def wrapper() -> None:
+            func()
+
+        return wrapper
+
+    async def _best(self, func: Callable[[], Awaitable[Any]], loops: int = 1) -> float:
+        # 每轮连续执行 loops 次取均值, 取各轮中的最小值以减小调度噪声
+        samples = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            for _ in range(loops):
+                await func()
+            samples.append((time.perf_counter() - start) / loops)
+        return min(samples)
+
+
+def compare(current: BenchReport, baseline: BenchReport, threshold: float) -> list[str]:
+    regressions = []
+    for name, result in current.results.items():
+        if (base := baseline.results.get(name)) is None or not base.value or not result.value:
+            continue
+        ratio = base.value / result.value if result.higherIsBetter else result.value / base.value
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {base.value} -> {result.value} {result.unit} ({ratio - 1:+.1%})")
+    return regressions
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the draw engine, table loading and serialization")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pulls", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="write the JSON report to this file")
+    parser.add_argument("--baseline", type=Path, help="JSON report of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown ratio, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+
+    report = asyncio.run(BenchmarkSuite(args.seed, args.pulls, args.repeat).run())
+    payload = mscjson.format(mscjson.encode(report))
+    if args.output:
+        args.output.write_bytes(payload)
+    else:
+        print(payload.decode())
+
+    if args.baseline:
+        baseline = mscjson.decode(args.baseline.read_bytes(), type=BenchReport)
+        if regressions := compare(report, baseline, args.threshold):
+            print(f"{len(regressions)} benchmark(s) regressed beyond {args.threshold:.0%}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print(f"no regression beyond {args.threshold:.0%} against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    _main()
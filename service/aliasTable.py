@@ -0,0 +1,66 @@
+from collections.abc import Sequence
+from functools import cached_property
+import random
+from typing import TYPE_CHECKING
+
+from msgspec import Struct
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class AliasTable(Struct, frozen=True, dict=True):
+    # Vose 别名表: 先等概率选列, 再以 prob[i] 决定取该列本身还是 alias[i]
+    prob: tuple[float, ...]
+    alias: tuple[int, ...]
+
+    @classmethod
+    def build(cls, weights: Sequence[float]) -> "AliasTable":
+        if not (n := len(weights)):
+            raise ValueError("alias table needs at least one weight")
+        if (total := sum(weights)) <= 0:
+            raise ValueError("total of weights must be greater than zero")
+
+        scaled = [w * n / total for w in weights]
+        prob = [0.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        # 剩余的列只受浮点误差影响, 概率应为 1
+        for i in small + large:
+            prob[i] = 1.0
+        return cls(prob=tuple(prob), alias=tuple(alias))
+
+    def __len__(self) -> int:
+        return len(self.prob)
+
+    def sample(self, rng: random.Random) -> int:
+        column = int(rng.random() * len(self.prob))
+        return column if rng.random() < self.prob[column] else self.alias[column]
+
+    def sampleMany(self, gen: "np.random.Generator", size: int) -> "np.ndarray":
+        # 批量取样(需要 numpy), 供模拟器等向量化场景使用
+        import numpy as np
+
+        probArray, aliasArray = self._arrays
+        column = gen.integers(0, len(self.prob), size)
+        return np.where(gen.random(size) < probArray[column], column, aliasArray[column])
+
+    @cached_property
+    def _arrays(self) -> tuple["np.ndarray", "np.ndarray"]:
+        import numpy as np
+
+        return np.asarray(self.prob), np.asarray(self.alias, dtype=np.int64)
+
+    def probabilities(self) -> list[float]:
+        n = len(self.prob)
+        result = [p / n for p in self.prob]
+        for p, j in zip(self.prob, self.alias):
+            result[j] += (1 - p) / n
+        return result
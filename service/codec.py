@@ -0,0 +1,66 @@
+import json
+from typing import Any
+
+from .compactState import GainedChars, PullHistory
+from .models import GachaTrackModel, PlayerGacha, PoolWeightItem
+
+from msgspec import json as mscjson, msgpack, to_builtins
+
+
+def encHook(obj: Any) -> Any:
+    if isinstance(obj, GainedChars | PullHistory):
+        return obj.toList()
+    raise NotImplementedError(f"Objects of type {type(obj).__name__} are not supported")
+
+
+def msgpackEncHook(obj: Any) -> Any:
+    if isinstance(obj, GainedChars | PullHistory):
+        return obj.pack()
+    raise NotImplementedError(f"Objects of type {type(obj).__name__} are not supported")
+
+
+def decHook(type_: type, obj: Any) -> Any:
+    if type_ is GainedChars or type_ is PullHistory:
+        # msgpack 中为 pack() 的打包形式(末项为 bytes), JSON 中为字符串列表
+        if obj and isinstance(obj[-1], bytes):
+            return type_.unpack(obj)
+        return type_(obj)
+    raise NotImplementedError(f"Objects of type {type_.__name__} are not supported")
+
+
+def toBuiltins(obj: Any) -> Any:
+    return to_builtins(obj, enc_hook=encHook)
+
+
+jsonEncoder = mscjson.Encoder(enc_hook=encHook)
+playerJsonDecoder = mscjson.Decoder(PlayerGacha)
+trackJsonDecoder = mscjson.Decoder(GachaTrackModel, dec_hook=decHook)
+msgpackEncoder = msgpack.Encoder(enc_hook=msgpackEncHook)
+
+
+class MsgpackCodec[T]:
+    # 二进制线上格式; 复用同一个 Encoder, JSON 仅作为调试视图
+    def __init__(self, type_: type[T]) -> None:
+        self.type_: type[T] = type_
+        self.decoder: msgpack.Decoder = msgpack.Decoder(type_, dec_hook=decHook)
+
+    def encode(self, obj: T) -> bytes:
+        # encode_into 会把缓冲区截到消息长度, 再复制成 bytes 反而多一次拷贝, 这里直接编码
+        return msgpackEncoder.encode(obj)
+
+    def encodeInto(self, obj: T, buffer: bytearray, offset: int = 0) -> int:
+        # 写入调用方的缓冲区(如在帧头之后), 缓冲区长度变为 offset + 消息长度, 返回消息长度
+        msgpackEncoder.encode_into(obj, buffer, offset)
+        return len(buffer) - offset
+
+    def decode(self, data: bytes) -> T:
+        return self.decoder.decode(data)
+
+
+playerCodec = MsgpackCodec(PlayerGacha)
+trackCodec = MsgpackCodec(GachaTrackModel)
+resultsCodec = MsgpackCodec(list[PoolWeightItem])
+
+
+def debugView(obj: Any) -> str:
+    return json.dumps(toBuiltins(obj), indent=2)
@@ -0,0 +1,177 @@
+from array import array
+from collections.abc import Iterable, Iterator
+import sys
+from threading import Lock
+from typing import ClassVar
+
+
+class CharIdTable:
+    _lock: ClassVar[Lock] = Lock()
+
+    def __init__(self) -> None:
+        self._ids: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def intern(self, charId: str) -> int:
+        if (idx := self._index.get(charId)) is None:
+            with self._lock:
+                if (idx := self._index.get(charId)) is None:
+                    idx = len(self._ids)
+                    if idx > 0xFFFF:
+                        raise OverflowError("too many distinct char ids to intern")
+                    self._ids.append(charId)
+                    self._index[charId] = idx
+        return idx
+
+    def find(self, charId: str) -> int | None:
+        return self._index.get(charId)
+
+    def lookup(self, idx: int) -> str:
+        return self._ids[idx]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+charIds = CharIdTable()
+
+
+def packIds(chars: array) -> tuple[list[str], bytes]:
+    # 进程内编号不可跨进程使用, 打包时改写为按本对象内出现的干员重新编号(小端)
+    used = sorted(set(chars))
+    local = {idx: i for i, idx in enumerate(used)}
+    packed = array("H", map(local.__getitem__, chars))
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return [charIds.lookup(idx) for idx in used], packed.tobytes()
+
+
+def unpackIds(names: list[str], data: bytes) -> array:
+    table = [charIds.intern(charId) for charId in names]
+    local = array("H")
+    local.frombytes(data)
+    if sys.byteorder == "big":
+        local.byteswap()
+    return array("H", map(table.__getitem__, local))
+
+
+class GainedChars:
+    # 按获取顺序保存干员编号(含重复), 另用位图提供 O(1) 的包含判断
+    __slots__ = ("chars", "_owned", "_missing")
+
+    def __init__(self, charIdList: Iterable[str] = ()) -> None:
+        self.chars: array = array("H")
+        self._owned: bytearray = bytearray()
+        self._missing: dict[tuple[str, ...], list[str]] | None = None
+        for charId in charIdList:
+            self.append(charId)
+
+    @classmethod
+    def unpack(cls, packed: list) -> "GainedChars":
+        gained = cls()
+        gained.chars = unpackIds(*packed)
+        for idx in set(gained.chars):
+            gained._mark(idx)
+        return gained
+
+    def pack(self) -> list:
+        return list(packIds(self.chars))
+
+    def _mark(self, idx: int) -> None:
+        byte, bit = divmod(idx, 8)
+        if byte >= len(self._owned):
+            self._owned.extend(bytes(byte - len(self._owned) + 1))
+        self._owned[byte] |= 1 << bit
+
+    def append(self, charId: str) -> None:
+        idx = charIds.intern(charId)
+        self.chars.append(idx)
+        self._mark(idx)
+        if self._missing:
+            for missing in self._missing.values():
+                if charId in missing:
+                    missing.remove(charId)
+
+    def missing(self, charIdList: list[str]) -> list[str]:
+        # 返回 charIdList 中尚未获得的干员(保持原顺序), 结果随 append 增量维护, 调用方不应修改
+        if self._missing is None:
+            self._missing = {}
+        key = tuple(charIdList)
+        if (missing := self._missing.get(key)) is None:
+            missing = self._missing[key] = [c for c in charIdList if c not in self]
+        return missing
+
+    def __contains__(self, charId: object) -> bool:
+        if not isinstance(charId, str) or (idx := charIds.find(charId)) is None:
+            return False
+        byte, bit = divmod(idx, 8)
+        return byte < len(self._owned) and bool(self._owned[byte] & (1 << bit))
+
+    def __iter__(self) -> Iterator[str]:
+        return map(charIds.lookup, self.chars)
+
+    def __len__(self) -> int:
+        return len(self.chars)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, GainedChars):
+            return self.chars == other.chars
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"GainedChars({list(self)!r})"
+
+    def toList(self) -> list[str]:
+        return list(self)
+
+
+class PullHistory:
+    # 每次寻访记录 2 字节干员编号 + 1 字节稀有度, 序列化时还原为 "id&rarity"
+    __slots__ = ("chars", "rarities")
+
+    def __init__(self, entries: Iterable[str] = ()) -> None:
+        self.chars: array = array("H")
+        self.rarities: bytearray = bytearray()
+        for entry in entries:
+            self.append(entry)
+
+    @classmethod
+    def unpack(cls, packed: list) -> "PullHistory":
+        names, chars, rarities = packed
+        history = cls()
+        history.chars = unpackIds(names, chars)
+        history.rarities = bytearray(rarities)
+        return history
+
+    def pack(self) -> list:
+        return [*packIds(self.chars), bytes(self.rarities)]
+
+    def record(self, charId: str, rarity: int) -> None:
+        self.chars.append(charIds.intern(charId))
+        self.rarities.append(rarity)
+
+    def append(self, entry: str) -> None:
+        charId, rarity = entry.split("&")[:2]
+        self.record(charId, int(rarity))
+
+    def __iter__(self) -> Iterator[str]:
+        lookup = charIds.lookup
+        return (f"{lookup(c)}&{r}" for c, r in zip(self.chars, self.rarities))
+
+    def __len__(self) -> int:
+        return len(self.chars)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, PullHistory):
+            return self.chars == other.chars and self.rarities == other.rarities
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"PullHistory({len(self)} pulls)"
+
+    def toList(self) -> list[str]:
+        return list(self)
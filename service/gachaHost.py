@@ -0,0 +1,158 @@
+import asyncio
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterable, Set
+from contextlib import asynccontextmanager
+import random
+
+from .gachaLogic import GachaService
+from .models import GachaTrackModel, PlayerGacha, PoolWeightItem
+from .stateStore import MemoryStateStore, PlayerStateStore
+from .tableRegistry import GachaTableRegistry
+
+
+class PlayerHandle:
+    __slots__ = ("playerId", "data", "track", "ownedChars", "lock", "pins")
+
+    def __init__(self, playerId: str, data: PlayerGacha, track: GachaTrackModel) -> None:
+        self.playerId: str = playerId
+        self.data: PlayerGacha = data
+        self.track: GachaTrackModel = track
+        self.ownedChars: Set[str] = frozenset()
+        self.lock: asyncio.Lock = asyncio.Lock()
+        # 已交给请求、尚未释放的次数; 大于 0 时不会被移出内存
+        self.pins: int = 0
+
+
+class GachaHost:
+    # 单个 GachaService 持有表、已编译卡池与触发器, 玩家只保留各自的 data/track;
+    # 最近使用的玩家常驻内存, 超出容量时写快照到 store 后移出
+    def __init__(
+        self,
+        store: PlayerStateStore | None = None,
+        capacity: int = 10000,
+        tables: GachaTableRegistry | None = None,
+        rng: random.Random | None = None,
+        showLog: bool = False,
+    ) -> None:
+        self.store: PlayerStateStore = store or MemoryStateStore()
+        self.capacity: int = capacity
+        self.engine: GachaService = GachaService(showLog=showLog, tables=tables, rng=rng)
+        self._hot: OrderedDict[str, PlayerHandle] = OrderedDict()
+        self._loading: dict[str, asyncio.Future[PlayerHandle]] = {}
+        self._spilling: dict[str, PlayerHandle] = {}
+        # 同一时刻只有一个移出流程, 避免同一玩家被重复写快照
+        self._evictLock: asyncio.Lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._hot)
+
+    def __contains__(self, playerId: object) -> bool:
+        return playerId in self._hot
+
+    def start(self) -> None:
+        self.store.start()
+
+    @asynccontextmanager
+    async def acquire(self, playerId: str) -> AsyncIterator[PlayerHandle]:
+        # 持有期间玩家被固定在内存中并加锁, 移出只会挑选未被固定的玩家
+        self.store.checkPlayerId(playerId)
+        handle = await self._pin(playerId)
+        try:
+            if len(self._hot) > self.capacity:
+                await self._evict()
+            async with handle.lock:
+                yield handle
+        finally:
+            handle.pins -= 1
+
+    async def _pin(self, playerId: str) -> PlayerHandle:
+        while True:
+            if (handle := self._hot.get(playerId)) is not None:
+                self._hot.move_to_end(playerId)
+                break
+            # 正在写快照的玩家直接放回内存, 其后的抽卡记录 seq 更大, 不会被快照截断
+            if (handle := self._spilling.get(playerId)) is not None:
+                self._hot[playerId] = handle
+                break
+            if (loading := self._loading.get(playerId)) is None:
+                handle = await self._load(playerId)
+                break
+            # 同一玩家并发冷启动时只从 store 恢复一次; 恢复完成后重新查找, 期间它可能已被移出
+            await loading
+        handle.pins += 1
+        return handle
+
+    async def _load(self, playerId: str) -> PlayerHandle:
+        loading = self._loading[playerId] = asyncio.get_running_loop().create_future()
+        try:
+            if (snapshot := await self.store.restore(playerId)) is not None:
+                handle = PlayerHandle(playerId, snapshot.data, snapshot.track)
+            else:
+                handle = PlayerHandle(playerId, GachaService.newPlayerData(), GachaTrackModel())
+            self._hot[playerId] = handle
+            loading.set_result(handle)
+        except BaseException as e:
+            loading.set_exception(e)
+            raise
+        finally:
+            del self._loading[playerId]
+        return handle
+
+    async def handleAdvancedGacha(self, playerId: str, poolId: str, useTkt: int = 0) -> PoolWeightItem:
+        async with self.acquire(playerId) as handle:
+            result = await self._bind(handle).handleAdvancedGacha(poolId, useTkt)
+            await self._record(handle, poolId, [result])
+        return result
+
+    async def handleTenAdvancedGacha(
+        self, playerId: str, poolId: str, useTkt: int = 0, itemId: str = "4003"
+    ) -> list[PoolWeightItem]:
+        async with self.acquire(playerId) as handle:
+            result = await self._bind(handle).handleTenAdvancedGacha(poolId, useTkt, itemId)
+            await self._record(handle, poolId, result)
+        return result
+
+    async def selectFesClassicUpChar(self, playerId: str, poolId: str, upChar: dict[str, list[str]]) -> None:
+        async with self.acquire(playerId) as handle:
+            self._bind(handle).selectFesClassicUpChar(poolId, upChar)
+            await self.store.saveSnapshot(playerId, handle.data, handle.track)
+
+    async def setOwnedChars(self, playerId: str, charIds: Iterable[str]) -> None:
+        # 拥有的角色来自游戏服务端, 不随快照持久化; 移出内存后需重新提供
+        async with self.acquire(playerId) as handle:
+            handle.ownedChars = frozenset(charIds)
+
+    async def close(self) -> None:
+        for playerId, handle in list(self._hot.items()):
+            await self.store.saveSnapshot(playerId, handle.data, handle.track)
+        self._hot.clear()
+        await self.store.close()
+
+    def _bind(self, handle: PlayerHandle) -> GachaService:
+        # 抽卡核心是同步执行的, 绑定后直到返回结果前不会切换到其他协程
+        self.engine.bind(handle.data, handle.track, handle.ownedChars)
+        return self.engine
+
+    async def _record(self, handle: PlayerHandle, poolId: str, result: list[PoolWeightItem]) -> None:
+        state = handle.track.pool[poolId]
+        for charHit in result:
+            state.history.record(charHit.id_, charHit.rarity)
+        await self.store.recordPulls(handle.playerId, handle.data, handle.track, poolId, result)
+
+    async def _evict(self) -> None:
+        async with self._evictLock:
+            while len(self._hot) > self.capacity:
+                for playerId, handle in self._hot.items():
+                    if not handle.pins:
+                        break
+                else:
+                    return
+                del self._hot[playerId]
+                self._spilling[playerId] = handle
+                try:
+                    await self.store.saveSnapshot(playerId, handle.data, handle.track)
+                finally:
+                    del self._spilling[playerId]
+                # 写快照期间被重新取用的玩家仍需保留日志序号
+                if playerId not in self._hot and not handle.pins:
+                    self.store.forget(playerId)
@@ -1,36 +1,73 @@
-import json
-from pathlib import Path
+from collections.abc import Set
 import random
+import time
 from typing import ClassVar
 
 from .gachaTrigger import GachaTrigger
+from .metrics import PullMetrics, metrics as defaultMetrics
 from .models import (
-    GachaDetailTable,
     GachaPoolClientData,
     GachaPoolInfo,
-    GachaTable,
     GachaTrackModel,
-    LinkageRuleType,
+    NewbeeGachaPoolClientData,
     PlayerGacha,
     PoolWeightItem,
     RuleType,
 )
-from .poolGenerator import PoolGenerator
-
-from loguru import logger
-from msgspec import convert, json as mscjson
+from .pullLog import PullLogger, pullLog as defaultPullLog
+from .rarityTable import RarityTable
+from .tableRegistry import GachaTableRegistry
 
 
 class GachaService:
-    RIT5_UP_CNT_1: ClassVar[int] = 15
-    RIT5_UP_CNT_2: ClassVar[int] = 20
-    RIT6_UP_CNT: ClassVar[int] = 50
+    RIT5_UP_CNT_1: ClassVar[int] = RarityTable.RIT5_UP_CNT_1
+    RIT5_UP_CNT_2: ClassVar[int] = RarityTable.RIT5_UP_CNT_2
+    RIT6_UP_CNT: ClassVar[int] = RarityTable.RIT6_UP_CNT
 
     forbiddenGachaPool: ClassVar[list[str]] = []
 
-    def __init__(self, showLog: bool = True) -> None:
+    def __init__(
+        self,
+        showLog: bool = True,
+        tables: GachaTableRegistry | None = None,
+        rng: random.Random | None = None,
+        pullLog: PullLogger | None = None,
+        metrics: PullMetrics | None = None,
+    ) -> None:
         self.showLog: bool = showLog
-        self.data = PlayerGacha(
+        self.pullLog: PullLogger = pullLog or defaultPullLog
+        self.metrics: PullMetrics = metrics or defaultMetrics
+        self.rng: random.Random = rng or random.Random()
+        self.data = self.newPlayerData()
+        self.track = GachaTrackModel()
+
+        # 未指定表时跟随共享注册表, 热更新后从下一次请求开始使用新表
+        self.followShared: bool = tables is None
+        self.tables: GachaTableRegistry = tables or GachaTableRegistry.shared()
+        self.Excel = self.tables.Excel
+        self.Server = self.tables.Server
+        self.trigger: GachaTrigger = GachaTrigger(self.data, self.track, self.tables, self.rng)
+
+    def bind(self, data: PlayerGacha, track: GachaTrackModel, ownedChars: Set[str] = frozenset()) -> None:
+        # 切换当前操作的玩家状态, 供 GachaHost 以单个服务实例处理多名玩家
+        self.data = data
+        self.track = track
+        self.trigger.bind(data, track, ownedChars)
+
+    def useTables(self, tables: GachaTableRegistry) -> None:
+        self.tables = tables
+        self.Excel = tables.Excel
+        self.Server = tables.Server
+        self.trigger.useTables(tables)
+
+    def refreshTables(self) -> None:
+        # 只在请求开始时切换; 同步的抽卡过程中不会换表, 进行中的请求在旧版本上完成
+        if self.followShared and (tables := GachaTableRegistry.shared()) is not self.tables:
+            self.useTables(tables)
+
+    @staticmethod
+    def newPlayerData() -> PlayerGacha:
+        return PlayerGacha(
             newbee=PlayerGacha.PlayerNewbeeGachaPool(
                 openFlag=1,
                 cnt=21,
@@ -43,68 +80,139 @@ class GachaService:
             limit={},
             linkage={}
         )
-        self.track = GachaTrackModel()
-
-        with Path("gacha_table.json").open(encoding="UTF-8") as f:
-            self.Excel = convert(json.load(f), GachaTable)
-        with Path("gacha_detail_table.json").open(encoding="UTF-8") as f:
-            self.Server = convert(json.load(f), GachaDetailTable)
-        self.trigger: GachaTrigger = GachaTrigger(self.data, self.track)
 
     async def doAdvancedGacha(self, poolId: str, ruleType: str) -> PoolWeightItem:
+        return (await self._drawBatchAsync(poolId, ruleType, 1))[0]
+
+    async def drawMany(self, poolId: str, n: int) -> list[PoolWeightItem]:
+        result = self.draw(poolId, n)
+        if self.pullLog.backlogged():
+            await self.pullLog.flush()
+        return result
+
+    async def _drawBatchAsync(self, poolId: str, ruleType: str, n: int) -> list[PoolWeightItem]:
+        result = self._drawBatch(poolId, ruleType, n)
+        # 抽卡事件超出环形缓冲区时等 sink 写完再返回, 对调用方形成背压
+        if self.pullLog.backlogged():
+            await self.pullLog.flush()
+        return result
+
+    def draw(self, poolId: str, n: int) -> list[PoolWeightItem]:
+        # 同步抽卡核心, 供批量模拟等不需要事件循环的调用方直接使用
+        self.refreshTables()
+        self._checkDetail(poolId)
+        rule = self.tables.rules.get(poolId)
+        rule.preDraw(self, self._tryGetTrackState(poolId))
+        return self._drawBatch(poolId, rule.ruleType, n)
+
+    def _drawBatch(self, poolId: str, ruleType: str, n: int) -> list[PoolWeightItem]:
+        metrics = self.metrics
+        batchStart = time.perf_counter_ns() if metrics.enabled else 0
         pool = self.Server.details[poolId]
         state = self._tryGetTrackState(poolId)
+        rule = self.tables.rules.get(poolId)
+
+        curPool = None
+        if poolId not in self.Excel.newbeeGachaPoolIds:
+            poolClient = self.Excel.gachaPoolClientById[poolId]
+            with metrics.stage(ruleType, "initRule"):
+                curPool = self._tryInitNormalPool(poolClient)
+                rule.initPool(self, poolClient)
+
+        with metrics.stage(ruleType, "buildPool"):
+            gachaPool = rule.compiledPool(self, poolId)
+
+        rarityTable = self.tables.rarity.get(poolId)
+        postGacha = self.trigger.resolve(poolId)
+        perCharList = None
+        if rule.upCharEnsure and pool.upCharInfo and pool.upCharInfo.perCharList:
+            perCharList = pool.upCharInfo.perCharList
+        isBoot = "BOOT" in poolId
+        pullLog = self.pullLog if self.showLog and self.pullLog.enabled() else None
+
+        # 未启用计时时 timed 返回原函数, 循环内没有额外分支
+        getGuaranteedRarity = metrics.timed(ruleType, "guaranteedRarity", self._getGuaranteedRarity)
+        getRarityHit = metrics.timed(ruleType, "rarityHit", self._getRarityHit)
+        drawChar = metrics.timed(ruleType, "drawChar", gachaPool.draw)
+        if postGacha is not None:
+            postGacha = metrics.timed(ruleType, "postGacha", postGacha)
 
-        guaranteed = await self._getGuaranteedRarity(poolId)
-        rarityHit = self._getRarityHit(poolId, guaranteed)
-        if "BOOT" in poolId and not state.totalCnt:
-            rarityHit = 3
-
-        if ruleType != RuleType.FESCLASSIC:
-            gachaPool = await PoolGenerator.build(pool)
-        else:
-            gachaPool = await PoolGenerator.build(pool, poolId, self.data)
-
-        weightPool = gachaPool[rarityHit]
-        charHit = random.choices(weightPool[0][1], weights=weightPool[0][0], k=1)[0]
-        charHit.beforeNonHitCnt = state.non6StarCnt
-
-        if ruleType != RuleType.FESCLASSIC and pool.upCharInfo and pool.upCharInfo.perCharList:
-            if state.totalCnt + 1 >= 60:
-                perChar = pool.upCharInfo.perCharList[-1]
-                if charHit.rarity == perChar.rarityRank == 4:
-                    if charIdList := [c for c in perChar.charIdList if c not in state.gain5Star]:
-                        charHit.id_ = random.choice(charIdList)
-            if state.totalCnt + 1 >= 200:
-                perChar = pool.upCharInfo.perCharList[0]
-                if charHit.rarity == perChar.rarityRank == 5:
-                    if charIdList := [c for c in perChar.charIdList if c not in state.gain6Star]:
-                        charHit.id_ = random.choice(charIdList)
-        await self.trigger.postAdvancedGacha(poolId, charHit)
-
-        if charHit.rarity == 4:
-            state.non5StarCnt = 0
-            state.gain5Star.append(charHit.id_)
-        if charHit.rarity == 5:
-            state.non6StarCnt = state.non5StarCnt = 0
-            state.gain6Star.append(charHit.id_)
-        else:
-            state.non5StarCnt += 1
-            state.non6StarCnt += 1
-        state.totalCnt += 1
+        result: list[PoolWeightItem] = []
+        for _ in range(n):
+            guaranteed = getGuaranteedRarity(curPool, state)
+            rarityHit = getRarityHit(rarityTable, state, guaranteed)
+            if isBoot and not state.totalCnt:
+                rarityHit = 3
+
+            charHit = drawChar(rarityHit, self.rng)
+            charHit.beforeNonHitCnt = state.non6StarCnt
+
+            if perCharList is not None:
+                if state.totalCnt + 1 >= 60:
+                    perChar = perCharList[-1]
+                    if charHit.rarity == perChar.rarityRank == 4:
+                        if charIdList := state.gain5Star.missing(perChar.charIdList):
+                            charHit.id_ = self.rng.choice(charIdList)
+                if state.totalCnt + 1 >= 200:
+                    perChar = perCharList[0]
+                    if charHit.rarity == perChar.rarityRank == 5:
+                        if charIdList := state.gain6Star.missing(perChar.charIdList):
+                            charHit.id_ = self.rng.choice(charIdList)
+            if postGacha is not None:
+                postGacha(charHit)
+
+            if charHit.rarity == 4:
+                state.non5StarCnt = 0
+                state.gain5Star.append(charHit.id_)
+            if charHit.rarity == 5:
+                state.non6StarCnt = state.non5StarCnt = 0
+                state.gain6Star.append(charHit.id_)
+            else:
+                state.non5StarCnt += 1
+                state.non6StarCnt += 1
+            state.totalCnt += 1
+
+            if pullLog is not None:
+                pullLog.emit(ruleType, poolId, state.totalCnt, charHit)
+            result.append(charHit)
+
+        if metrics.enabled:
+            metrics.countBatch(ruleType, n)
+            metrics.histogram(ruleType, "batch").record(time.perf_counter_ns() - batchStart)
+        return result
 
-        if self.showLog:
-            logger.debug(f"{ruleType}|{poolId}: {mscjson.decode(mscjson.encode(charHit))}")
-        return charHit
+    def getPoolClient(self, poolId: str) -> GachaPoolClientData | NewbeeGachaPoolClientData:
+        if poolId not in self.Excel.newbeeGachaPoolIds:
+            if not (pool := self.Excel.gachaPoolClientById.get(poolId)):
+                raise ValueError("invalid gacha pool id")
+        elif not (pool := self.Excel.newbeeGachaPoolClientById.get(poolId)):
+            raise ValueError("invalid gacha pool id")
+
+        if poolId in self.forbiddenGachaPool:
+            raise ValueError("当前寻访暂时无法使用, 详情请关注官方公告")
+        self._checkDetail(poolId)
+        return pool
+
+    def _checkDetail(self, poolId: str) -> None:
+        # 热更新后服务端详情可能已移除该卡池而 Excel 仍列出, 此时按无效卡池处理
+        if poolId not in self.Server.details:
+            raise ValueError("invalid gacha pool id")
+
+    async def handleAdvancedGacha(self, poolId: str, useTkt: int = 0) -> PoolWeightItem:
+        self.refreshTables()
+        self.getPoolClient(poolId)
+        return await self.tables.rules.get(poolId).single(self, poolId, useTkt)
+
+    async def handleTenAdvancedGacha(self, poolId: str, useTkt: int = 0, itemId: str = "4003") -> list[PoolWeightItem]:
+        self.refreshTables()
+        self.getPoolClient(poolId)
+        return await self.tables.rules.get(poolId).ten(self, poolId, useTkt, itemId)
 
     async def handleNormalGacha(self, poolId: str, useTkt: int) -> PoolWeightItem:
-        poolClient = next(p for p in self.Excel.gachaPoolClient if p.gachaPoolId == poolId)
+        poolClient = self.Excel.gachaPoolClientById[poolId]
         state = self._tryGetTrackState(poolId)
 
-        if not state.init:
-            if poolClient.gachaRuleType == RuleType.NORMAL:
-                state.non6StarCnt = self.track.nonNormal6StarCnt
-            state.init = 1
+        self.tables.rules.get(poolId).preDraw(self, state)
 
         ## === ↓ ***基础数据校验*** ↓ ===
         # poolClient.openTime <= now <= poolClient.endTime -> gacha pool not open
@@ -114,33 +222,25 @@ class GachaService:
         return await self.doAdvancedGacha(poolId, poolClient.gachaRuleType)
 
     async def handleTenNormalGacha(self, poolId: str, itemId: str, useTkt: int) -> list[PoolWeightItem]:
-        poolClient = next(p for p in self.Excel.gachaPoolClient if p.gachaPoolId == poolId)
+        poolClient = self.Excel.gachaPoolClientById[poolId]
         state = self._tryGetTrackState(poolId)
 
-        if not state.init:
-            if poolClient.gachaRuleType == RuleType.NORMAL:
-                state.non6StarCnt = self.track.nonNormal6StarCnt
-            state.init = 1
+        self.tables.rules.get(poolId).preDraw(self, state)
 
         ## === ↓ ***基础数据校验*** ↓ ===
         # poolClient.openTime <= now <= poolClient.endTime -> gacha pool not open
         # useTkt:4|LINKAGE_TKT_GACHA_10 -> useTkt:2|TKT_GACHA_10 -> useTkt:5|TKT_GACHA -> useTkt:0|DIAMOND_SHD -> gacha tkt state error
         ## === ↑ ***基础数据校验*** ↑ ===
 
-        result: list[PoolWeightItem] = []
-        for _ in range(10):
-            obj = await self.doAdvancedGacha(poolId, poolClient.gachaRuleType)
-            result.append(obj)
-        return result
+        return await self._drawBatchAsync(poolId, poolClient.gachaRuleType, 10)
 
     async def handleNewbeeGacha(self, poolId: str) -> PoolWeightItem:
-        poolClient = next(p for p in self.Excel.newbeeGachaPoolClient if p.gachaPoolId == poolId)
-        carousel = next(g for g in self.Excel.carousel if g.poolId == poolId)
+        poolClient = self.Excel.newbeeGachaPoolClientById[poolId]
+        carousel = self.Excel.carouselByPoolId[poolId]
         curPool = self.data.newbee
         state = self._tryGetTrackState(poolId)
 
-        if not state.init:
-            state.init = 1
+        self.tables.rules.get(poolId).preDraw(self, state)
 
         ## === ↓ ***基础数据校验*** ↓ ===
         # carousel.startTime <= now <= carousel.endTime | openFlag -> gacha pool not open
@@ -153,13 +253,12 @@ class GachaService:
         return await self.doAdvancedGacha(poolId, RuleType.NEWBEE)
 
     async def handleTenNewbieGacha(self, poolId: str) -> list[PoolWeightItem]:
-        poolClient = next(p for p in self.Excel.newbeeGachaPoolClient if p.gachaPoolId == poolId)
-        carousel = next(g for g in self.Excel.carousel if g.poolId == poolId)
+        poolClient = self.Excel.newbeeGachaPoolClientById[poolId]
+        carousel = self.Excel.carouselByPoolId[poolId]
         curPool = self.data.newbee
         state = self._tryGetTrackState(poolId)
 
-        if not state.init:
-            state.init = 1
+        self.tables.rules.get(poolId).preDraw(self, state)
 
         ## === ↓ ***基础数据校验*** ↓ ===
         # carousel.startTime <= now <= carousel.endTime | openFlag -> gacha pool not open
@@ -168,19 +267,14 @@ class GachaService:
 
         curPool.cnt -= 10
 
-        result: list[PoolWeightItem] = []
-        for _ in range(10):
-            obj = await self.doAdvancedGacha(poolId, RuleType.NEWBEE)
-            result.append(obj)
-        return result
+        return await self._drawBatchAsync(poolId, RuleType.NEWBEE, 10)
 
     async def handleLimitedGacha(self, poolId: str, useTkt: int) -> tuple[PoolWeightItem, list]:
-        poolClient = next(p for p in self.Excel.gachaPoolClient if p.gachaPoolId == poolId)
+        poolClient = self.Excel.gachaPoolClientById[poolId]
         state = self._tryGetTrackState(poolId)
         itemGet = []
 
-        if not state.init:
-            state.init = 1
+        self.tables.rules.get(poolId).preDraw(self, state)
 
         ## === ↓ ***基础数据校验*** ↓ ===
         # poolClient.openTime <= now <= poolClient.endTime -> gacha pool not open
@@ -194,12 +288,11 @@ class GachaService:
         return await self.doAdvancedGacha(poolId, poolClient.gachaRuleType), itemGet
 
     async def handleTenLimitedGacha(self, poolId: str, itemId: str, useTkt: int) -> tuple[list[PoolWeightItem], list[list]]:
-        poolClient = next(p for p in self.Excel.gachaPoolClient if p.gachaPoolId == poolId)
+        poolClient = self.Excel.gachaPoolClientById[poolId]
         state = self._tryGetTrackState(poolId)
         itemGet = []
 
-        if not state.init:
-            state.init = 1
+        self.tables.rules.get(poolId).preDraw(self, state)
 
         ## === ↓ ***基础数据校验*** ↓ ===
         # poolClient.openTime <= now <= poolClient.endTime -> gacha pool not open
@@ -207,19 +300,13 @@ class GachaService:
         ## === ↑ ***基础数据校验*** ↑ ===
 
         # 处理 lmtgs -> itemGet
-        result: list[PoolWeightItem] = []
-
-        for _ in range(10):
-            obj = await self.doAdvancedGacha(poolId, poolClient.gachaRuleType)
-            result.append(obj)
-        return result, itemGet
+        return await self._drawBatchAsync(poolId, poolClient.gachaRuleType, 10), itemGet
 
     async def handleClassicGacha(self, poolId: str, useTkt: int) -> PoolWeightItem:
-        poolClient = next(p for p in self.Excel.gachaPoolClient if p.gachaPoolId == poolId)
+        poolClient = self.Excel.gachaPoolClientById[poolId]
         state = self._tryGetTrackState(poolId)
 
-        if not state.init:
-            state.init = 1
+        self.tables.rules.get(poolId).preDraw(self, state)
 
         ## === ↓ ***基础数据校验*** ↓ ===
         # poolClient.openTime <= now <= poolClient.endTime -> gacha pool not open
@@ -229,134 +316,62 @@ class GachaService:
         return await self.doAdvancedGacha(poolId, poolClient.gachaRuleType)
 
     async def handleTenClassicGacha(self, poolId: str, useTkt: int) -> list[PoolWeightItem]:
-        poolClient = next(p for p in self.Excel.gachaPoolClient if p.gachaPoolId == poolId)
+        poolClient = self.Excel.gachaPoolClientById[poolId]
         state = self._tryGetTrackState(poolId)
 
-        if not state.init:
-            state.init = 1
+        self.tables.rules.get(poolId).preDraw(self, state)
 
         ## === ↓ ***基础数据校验*** ↓ ===
         # poolClient.openTime <= now <= poolClient.endTime -> gacha pool not open
         # useTkt:7|CLASSIC_TKT_GACHA_10 -> useTkt:8|CLASSIC_TKT_GACHA -> useTkt:2|TKT_GACHA_10 -> useTkt:5|TKT_GACHA -> useTkt:0|DIAMOND_SHD -> gacha tkt state error
         ## === ↑ ***基础数据校验*** ↑ ===
 
-        result: list[PoolWeightItem] = []
-        for _ in range(10):
-            obj = await self.doAdvancedGacha(poolId, poolClient.gachaRuleType)
-            result.append(obj)
-        return result
+        return await self._drawBatchAsync(poolId, poolClient.gachaRuleType, 10)
 
     async def tryInitGachaRule(self, poolClient: GachaPoolClientData) -> None:
-        poolId = poolClient.gachaPoolId
-        match poolClient.gachaRuleType:
-            case RuleType.ATTAIN | RuleType.CLASSIC_ATTAIN:
-                await self._initAttainPoolState(poolId, poolClient)
-            case RuleType.LINKAGE:
-                await self._initLinkagePoolState(poolId, poolClient)
-            case RuleType.SINGLE:
-                await self._initSinglePoolState(poolId)
-            case RuleType.FESCLASSIC:
-                await self._initFesClassicPoolState(poolId)
+        self.initGachaRule(poolClient)
+
+    def initGachaRule(self, poolClient: GachaPoolClientData) -> None:
+        self.tables.rules.get(poolClient.gachaPoolId).initPool(self, poolClient)
+
+    def selectFesClassicUpChar(self, poolId: str, upChar: dict[str, list[str]]) -> None:
+        if (fesClassic := self.data.fesClassic.get(poolId)) is None:
+            self.data.fesClassic[poolId] = self.data.PlayerFesClassicGacha(upChar=upChar)
+            return
+        # 选择是编译缓存键的一部分, 旧选择的编译结果可能仍被其他玩家使用, 不从缓存移除
+        fesClassic.upChar = upChar
 
     def _tryGetTrackState(self, poolId: str) -> GachaPoolInfo:
         self.track.pool.setdefault(poolId, GachaPoolInfo())
         return self.track.pool[poolId]
 
-    async def _initAttainPoolState(self, poolId: str, poolClient: GachaPoolClientData) -> None:
-        attain6Count = (poolClient.dynMeta or {}).get("attainRare6Num", 0)
-        poolObj = self.data.PlayerAttainGacha(attain6Count=attain6Count)
-        self.data.attain.setdefault(poolId, poolObj)
-
-    async def _initLinkagePoolState(self, poolId: str, poolClient: GachaPoolClientData) -> None:
-        pool = self.Server.details[poolId]
-        if (upCharInfo := pool.upCharInfo) and poolClient.linkageParam:
-            match rType := poolClient.linkageRuleId:
-                case LinkageRuleType.LINKAGE_R6_01:
-                    poolObj = self.data.PlayerLinkageGacha(
-                        next5=True,
-                        next5Char="",
-                        must6=True,
-                        must6Char=upCharInfo.perCharList[0].charIdList[0],
-                        must6Count=poolClient.linkageParam["guaranteeTarget6Count"],
-                        must6Level=5
-                    )
-                case LinkageRuleType.LINKAGE_MH_01:
-                    poolObj = self.data.PlayerLinkageGacha(
-                        next5=False,
-                        next5Char="",
-                        must6=True,
-                        must6Char=upCharInfo.perCharList[0].charIdList[0],
-                        must6Count=poolClient.linkageParam["guaranteeTarget6Count"],
-                        must6Level=5
-                    )
-                case _:
-                    raise ValueError("invalid linkage gacha rule id")
-            self.data.linkage.setdefault(rType, {})
-            self.data.linkage[rType].setdefault(poolId, poolObj)
-
-    async def _initSinglePoolState(self, poolId: str) -> None:
-        pool = self.Server.details[poolId]
-        if upCharInfo := pool.upCharInfo:
-            poolObj = self.data.PlayerSingleGacha(
-                singleEnsureCnt=0,
-                singleEnsureUse=False,
-                singleEnsureChar=upCharInfo.perCharList[0].charIdList[0]
-            )
-            self.data.single.setdefault(poolId, poolObj)
+    @classmethod
+    def getRarityWeights(cls, baseWeights: list[float], non6StarCnt: int, non5StarCnt: int) -> list[float]:
+        return RarityTable.rarityWeights(baseWeights, non6StarCnt, non5StarCnt)
 
-    async def _initFesClassicPoolState(self, poolId: str) -> None:
-        poolObj = self.data.PlayerFesClassicGacha(upChar={})
-        self.data.fesClassic.setdefault(poolId, poolObj)
-
-    def _getRarityHit(self, poolId: str, guaranteed: int) -> int:
-        pool = self.Server.details[poolId]
-        perAvailList = pool.availCharInfo.perAvailList
-        state = self._tryGetTrackState(poolId)
-        rarityWeights = [0.0] * 2 + [i.totalPercent for i in reversed(perAvailList)]
-
-        add6StarWeight = 0
-        if state.non6StarCnt >= self.RIT6_UP_CNT:
-            add6StarWeight += rarityWeights[5] * (1 + state.non6StarCnt - self.RIT6_UP_CNT)
-            if rarityWeights[5] + add6StarWeight > 1:
-                add6StarWeight = 1 - rarityWeights[5]
-            rarityWeights[5] += add6StarWeight
-
-        add5StarWeight = 0
-        if (cnt51 := min(1 + state.non5StarCnt - self.RIT5_UP_CNT_1, 5)) > 0:
-            add5StarWeight += rarityWeights[4] * cnt51 * 0.25
-        if (cnt52 := 1 + state.non5StarCnt - self.RIT5_UP_CNT_2) >= 0:
-            add5StarWeight += rarityWeights[4] * cnt52 * 0.5
-        rarityWeights[4] += add5StarWeight
-
-        totalWeight = 0
-        for i in range(5, -1, -1):
-            rarityWeights[i] = min(rarityWeights[i], 1 - totalWeight)
-            totalWeight += rarityWeights[i]
-        rarityWeights[2] = max(0, 1 - sum(rarityWeights[3:6]))
-
-        rarityHit = random.choices(range(6), weights=rarityWeights, k=1)[0]
+    def _getRarityHit(self, rarityTable: RarityTable, state: GachaPoolInfo, guaranteed: int) -> int:
+        rarityHit = rarityTable.roll(state.non6StarCnt, state.non5StarCnt, self.rng)
         return max(rarityHit, guaranteed)
 
-    async def _getGuaranteedRarity(self, poolId: str) -> int:
-        newbeeGachaIds = [p.gachaPoolId for p in self.Excel.newbeeGachaPoolClient]
+    def _tryInitNormalPool(self, poolClient: GachaPoolClientData) -> PlayerGacha.PlayerGachaPool:
+        poolId = poolClient.gachaPoolId
+        if poolId not in self.data.normal:
+            self.data.normal[poolId] = self.data.PlayerGachaPool(
+                cnt=0,
+                maxCnt=poolClient.guarantee5Count,
+                rarity=4,
+                avail=bool(poolClient.guarantee5Avail)
+            )
+        return self.data.normal[poolId]
+
+    def _getGuaranteedRarity(self, curPool: PlayerGacha.PlayerGachaPool | None, state: GachaPoolInfo) -> int:
         guaranteedRarity = 2
-        if poolId not in newbeeGachaIds:
-            poolClient = next(p for p in self.Excel.gachaPoolClient if p.gachaPoolId == poolId)
-            if poolId not in self.data.normal:
-                self.data.normal[poolId] = self.data.PlayerGachaPool(
-                    cnt=0,
-                    maxCnt=poolClient.guarantee5Count,
-                    rarity=4,
-                    avail=bool(poolClient.guarantee5Avail)
-                )
-            curPool = self.data.normal[poolId]
+        if curPool is not None:
             if curPool.avail and curPool.cnt + 1 == curPool.maxCnt:
                 guaranteedRarity = curPool.rarity
-            await self.tryInitGachaRule(poolClient)
         else:
-            cur = self.track.pool[poolId]
-            if not cur.gain6Star and cur.totalCnt + 1 == 10:
+            if not state.gain6Star and state.totalCnt + 1 == 10:
                 guaranteedRarity = 5
-            if not cur.gain5Star and cur.totalCnt + 1 == 21:
+            if not state.gain5Star and state.totalCnt + 1 == 21:
                 guaranteedRarity = 4
         return guaranteedRarity
@@ -0,0 +1,295 @@
+from collections.abc import Callable
+from typing import TYPE_CHECKING, ClassVar
+
+from .models import (
+    GachaPoolClientData,
+    GachaPoolInfo,
+    GachaTable,
+    LinkageRuleType,
+    PoolWeightItem,
+    RuleType,
+)
+from .poolGenerator import CompiledPool
+
+if TYPE_CHECKING:
+    from .gachaLogic import GachaService
+    from .gachaTrigger import GachaTrigger
+
+
+class GachaRule:
+    # 一种卡池类型的全部行为; 每种类型只注册一个无状态实例, 玩家状态通过 service/trigger 传入
+    ruleType: ClassVar[str]
+    # 是否对 upCharInfo 中的 5★/6★ 角色执行 60/200 抽保底
+    upCharEnsure: ClassVar[bool] = True
+
+    def initPool(self, service: "GachaService", poolClient: GachaPoolClientData) -> None:
+        return
+
+    def preDraw(self, service: "GachaService", state: GachaPoolInfo) -> None:
+        state.init = 1
+
+    def compiledPool(self, service: "GachaService", poolId: str) -> CompiledPool:
+        return service.tables.pools.get(poolId)
+
+    def postDraw(self, trigger: "GachaTrigger", poolId: str, charHit: PoolWeightItem) -> None:
+        return
+
+    async def single(self, service: "GachaService", poolId: str, useTkt: int) -> PoolWeightItem:
+        raise ValueError("开源版本仅做演示, 该类型卡池请自行完善")
+
+    async def ten(self, service: "GachaService", poolId: str, useTkt: int, itemId: str) -> list[PoolWeightItem]:
+        raise ValueError("开源版本仅做演示, 该类型卡池请自行完善")
+
+
+class GachaRuleRegistry:
+    def __init__(self) -> None:
+        self.rules: dict[str, GachaRule] = {}
+        self.linkageRules: dict[str, GachaRule] = {}
+
+    def register[R: GachaRule](
+        self, ruleType: str, linkageRuleId: str | None = None
+    ) -> Callable[[type[R]], type[R]]:
+        def decorator(cls: type[R]) -> type[R]:
+            cls.ruleType = ruleType
+            if linkageRuleId is None:
+                self.rules[ruleType] = cls()
+            else:
+                self.linkageRules[linkageRuleId] = cls()
+            return cls
+
+        return decorator
+
+    def resolve(self, ruleType: str, linkageRuleId: str | None = None) -> GachaRule:
+        if ruleType == RuleType.LINKAGE:
+            if (rule := self.linkageRules.get(linkageRuleId or "")) is None:
+                raise ValueError("invalid linkage gacha rule id")
+            return rule
+        if (rule := self.rules.get(ruleType)) is None:
+            raise ValueError(f"invalid gacha rule type: {ruleType}")
+        return rule
+
+
+ruleRegistry = GachaRuleRegistry()
+
+
+class PoolRuleCache:
+    # 按卡池缓存解析结果, 抽卡时只需一次字典查找
+    def __init__(self, excel: GachaTable, registry: GachaRuleRegistry = ruleRegistry) -> None:
+        self.excel: GachaTable = excel
+        self.registry: GachaRuleRegistry = registry
+        self._byPoolId: dict[str, GachaRule] = {}
+
+    def get(self, poolId: str) -> GachaRule:
+        if (rule := self._byPoolId.get(poolId)) is None:
+            if poolId in self.excel.newbeeGachaPoolIds:
+                rule = self.registry.resolve(RuleType.NEWBEE)
+            elif (poolClient := self.excel.gachaPoolClientById.get(poolId)) is not None:
+                rule = self.registry.resolve(poolClient.gachaRuleType, poolClient.linkageRuleId)
+            else:
+                raise ValueError("invalid gacha pool id")
+            self._byPoolId[poolId] = rule
+        return rule
+
+    def __len__(self) -> int:
+        return len(self._byPoolId)
+
+
+@ruleRegistry.register(RuleType.NORMAL)
+class NormalRule(GachaRule):
+    def preDraw(self, service: "GachaService", state: GachaPoolInfo) -> None:
+        # 常驻卡池共享 6★ 保底计数
+        if not state.init:
+            state.non6StarCnt = service.track.nonNormal6StarCnt
+            state.init = 1
+
+    def postDraw(self, trigger: "GachaTrigger", poolId: str, charHit: PoolWeightItem) -> None:
+        trigger.track.nonNormal6StarCnt = trigger.track.pool[poolId].non6StarCnt
+
+    async def single(self, service: "GachaService", poolId: str, useTkt: int) -> PoolWeightItem:
+        return await service.handleNormalGacha(poolId, useTkt)
+
+    async def ten(self, service: "GachaService", poolId: str, useTkt: int, itemId: str) -> list[PoolWeightItem]:
+        return await service.handleTenNormalGacha(poolId, itemId, useTkt)
+
+
+@ruleRegistry.register(RuleType.NEWBEE)
+class NewbeeRule(GachaRule):
+    async def single(self, service: "GachaService", poolId: str, useTkt: int) -> PoolWeightItem:
+        return await service.handleNewbeeGacha(poolId)
+
+    async def ten(self, service: "GachaService", poolId: str, useTkt: int, itemId: str) -> list[PoolWeightItem]:
+        return await service.handleTenNewbieGacha(poolId)
+
+
+@ruleRegistry.register(RuleType.SINGLE)
+class SingleRule(GachaRule):
+    def initPool(self, service: "GachaService", poolClient: GachaPoolClientData) -> None:
+        pool = service.Server.details[poolId := poolClient.gachaPoolId]
+        if upCharInfo := pool.upCharInfo:
+            poolObj = service.data.PlayerSingleGacha(
+                singleEnsureCnt=0,
+                singleEnsureUse=False,
+                singleEnsureChar=upCharInfo.perCharList[0].charIdList[0]
+            )
+            service.data.single.setdefault(poolId, poolObj)
+
+    def postDraw(self, trigger: "GachaTrigger", poolId: str, charHit: PoolWeightItem) -> None:
+        pool = trigger.Server.details[poolId]
+        single = trigger.data.single[poolId]
+        charHit.singleEnsureCnt = 150 if single.singleEnsureCnt < 0 else single.singleEnsureCnt
+        charHit.isSingleEnsure = False
+
+        if single.singleEnsureUse or not pool.upCharInfo:
+            return
+        must6Char = pool.upCharInfo.perCharList[0].charIdList[0]
+        if single.singleEnsureCnt >= 0:
+            if single.singleEnsureCnt + 1 < 150:
+                if charHit.id_ != must6Char:
+                    single.singleEnsureCnt += 1
+                else:
+                    single.singleEnsureCnt = 0
+            elif charHit.id_ != must6Char:
+                single.singleEnsureCnt -= 1
+            else:
+                single.singleEnsureCnt = 0
+        elif charHit.rarity == 5:
+            charHit.id_ = single.singleEnsureChar
+            single.singleEnsureUse = True
+            charHit.isSingleEnsure = True
+
+    async def single(self, service: "GachaService", poolId: str, useTkt: int) -> PoolWeightItem:
+        return await service.handleNormalGacha(poolId, useTkt)
+
+    async def ten(self, service: "GachaService", poolId: str, useTkt: int, itemId: str) -> list[PoolWeightItem]:
+        return await service.handleTenNormalGacha(poolId, itemId, useTkt)
+
+
+@ruleRegistry.register(RuleType.LIMITED)
+class LimitedRule(GachaRule):
+    async def single(self, service: "GachaService", poolId: str, useTkt: int) -> PoolWeightItem:
+        result, itemGet = await service.handleLimitedGacha(poolId, useTkt)
+        return result
+
+    async def ten(self, service: "GachaService", poolId: str, useTkt: int, itemId: str) -> list[PoolWeightItem]:
+        result, itemGet = await service.handleTenLimitedGacha(poolId, itemId, useTkt)
+        return result
+
+
+@ruleRegistry.register(RuleType.CLASSIC)
+class ClassicRule(GachaRule):
+    def postDraw(self, trigger: "GachaTrigger", poolId: str, charHit: PoolWeightItem) -> None:
+        trigger.track.nonClassic6StarCnt = trigger.track.pool[poolId].non6StarCnt
+        charHit.isClassic = True
+
+    async def single(self, service: "GachaService", poolId: str, useTkt: int) -> PoolWeightItem:
+        return await service.handleClassicGacha(poolId, useTkt)
+
+    async def ten(self, service: "GachaService", poolId: str, useTkt: int, itemId: str) -> list[PoolWeightItem]:
+        return await service.handleTenClassicGacha(poolId, useTkt)
+
+
+@ruleRegistry.register(RuleType.FESCLASSIC)
+class FesClassicRule(GachaRule):
+    upCharEnsure: ClassVar[bool] = False
+
+    def initPool(self, service: "GachaService", poolClient: GachaPoolClientData) -> None:
+        poolObj = service.data.PlayerFesClassicGacha(upChar={})
+        service.data.fesClassic.setdefault(poolClient.gachaPoolId, poolObj)
+
+    def compiledPool(self, service: "GachaService", poolId: str) -> CompiledPool:
+        return service.tables.pools.get(poolId, service.data.fesClassic[poolId].upChar)
+
+    def postDraw(self, trigger: "GachaTrigger", poolId: str, charHit: PoolWeightItem) -> None:
+        trigger.track.nonClassic6StarCnt = trigger.track.pool[poolId].non6StarCnt
+        charHit.isClassic = True
+
+
+@ruleRegistry.register(RuleType.ATTAIN)
+class AttainRule(GachaRule):
+    def initPool(self, service: "GachaService", poolClient: GachaPoolClientData) -> None:
+        attain6Count = (poolClient.dynMeta or {}).get("attainRare6Num", 0)
+        poolObj = service.data.PlayerAttainGacha(attain6Count=attain6Count)
+        service.data.attain.setdefault(poolClient.gachaPoolId, poolObj)
+
+    def postDraw(self, trigger: "GachaTrigger", poolId: str, charHit: PoolWeightItem) -> None:
+        attain = trigger.data.attain[poolId]
+        if not attain.attain6Count or charHit.rarity != 5:
+            return
+        # 候选 6★ 集合随已编译卡池缓存, 与已拥有角色取差集; 排序后再取样, 同一随机序列下结果确定
+        attainPool = trigger.tables.pools.get(poolId).candidateSet(5)
+        if owned := trigger.ownedChars:
+            attainPool = attainPool.difference(owned)
+        if attainPool:
+            charHit.id_ = trigger.rng.choice(sorted(attainPool))
+        attain.attain6Count -= 1
+
+
+@ruleRegistry.register(RuleType.CLASSIC_ATTAIN)
+class ClassicAttainRule(AttainRule):
+    def postDraw(self, trigger: "GachaTrigger", poolId: str, charHit: PoolWeightItem) -> None:
+        charHit.isClassic = True
+        super().postDraw(trigger, poolId, charHit)
+
+
+class LinkageRule(GachaRule):
+    next5: ClassVar[bool] = False
+
+    def initPool(self, service: "GachaService", poolClient: GachaPoolClientData) -> None:
+        pool = service.Server.details[poolId := poolClient.gachaPoolId]
+        if (ruleId := poolClient.linkageRuleId) is None:
+            raise ValueError("invalid linkage gacha rule id")
+        if (upCharInfo := pool.upCharInfo) and poolClient.linkageParam:
+            poolObj = service.data.PlayerLinkageGacha(
+                next5=self.next5,
+                next5Char="",
+                must6=True,
+                must6Char=upCharInfo.perCharList[0].charIdList[0],
+                must6Count=poolClient.linkageParam["guaranteeTarget6Count"],
+                must6Level=5
+            )
+            service.data.linkage.setdefault(ruleId, {}).setdefault(poolId, poolObj)
+
+    def postDraw(self, trigger: "GachaTrigger", poolId: str, charHit: PoolWeightItem) -> None:
+        if not (linkageGroup := trigger.data.linkage):
+            return
+        if not (upCharInfo := trigger.Server.details[poolId].upCharInfo):
+            return
+        if (ruleId := trigger.Excel.gachaPoolClientById[poolId].linkageRuleId) is None:
+            raise ValueError("invalid linkage gacha rule id")
+        linkage = linkageGroup[ruleId][poolId]
+        if linkage.must6:
+            linkage.must6Count -= 1
+            if linkage.must6Count <= 0:
+                charHit.id_ = linkage.must6Char
+                charHit.rarity = linkage.must6Level
+        if charHit.rarity == 5 and charHit.id_ == linkage.must6Char:
+            linkage.must6 = False
+            linkage.must6Char = ""
+            linkage.must6Count = 0
+        if self.next5:
+            level5CharIdList = upCharInfo.perCharList[-1].charIdList
+            if charHit.rarity == 4 and charHit.id_ in level5CharIdList:
+                if linkage.next5 and linkage.next5Char != "":
+                    charHit.id_ = linkage.next5Char
+                if charHit.id_ in level5CharIdList:
+                    if next5Chars := trigger.track.pool[poolId].gain5Star.missing(level5CharIdList):
+                        linkage.next5Char = next5Chars[0]
+                    else:
+                        linkage.next5 = False
+                        linkage.next5Char = ""
+
+    async def single(self, service: "GachaService", poolId: str, useTkt: int) -> PoolWeightItem:
+        return await service.handleNormalGacha(poolId, useTkt)
+
+    async def ten(self, service: "GachaService", poolId: str, useTkt: int, itemId: str) -> list[PoolWeightItem]:
+        return await service.handleTenNormalGacha(poolId, itemId, useTkt)
+
+
+@ruleRegistry.register(RuleType.LINKAGE, LinkageRuleType.LINKAGE_R6_01)
+class LinkageR6Rule(LinkageRule):
+    next5: ClassVar[bool] = True
+
+
+@ruleRegistry.register(RuleType.LINKAGE, LinkageRuleType.LINKAGE_MH_01)
+class LinkageMHRule(LinkageRule):
+    pass
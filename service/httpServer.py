@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable
+import math
+import time
+from pathlib import Path
+from typing import Any, ClassVar
+from urllib.parse import urlsplit
+
+from .codec import jsonEncoder, msgpackEncoder
+from .gachaHost import GachaHost
+from .metrics import metrics
+from .models import PoolWeightItem
+from .stateStore import FileStateStore, PlayerStateStore
+from .tableRegistry import GachaTableRegistry
+from .tableReloader import TableReloader
+
+from loguru import logger
+from msgspec import DecodeError, Struct, ValidationError, json as mscjson, msgpack
+
+
+class GachaRequest(Struct):
+    playerId: str
+    poolId: str
+    useTkt: int = 0
+    itemId: str = "4003"
+
+
+class GachaResponse(Struct):
+    playerId: str
+    poolId: str
+    result: list[PoolWeightItem]
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status: int = status
+
+
+class LatencyRecorder:
+    def __init__(self, maxSamples: int = 10000) -> None:
+        self.maxSamples: int = maxSamples
+        self._samples: dict[str, deque[int]] = {}
+        self._counts: dict[str, int] = {}
+
+    def record(self, route: str, elapsedNs: int) -> None:
+        if (samples := self._samples.get(route)) is None:
+            samples = self._samples[route] = deque(maxlen=self.maxSamples)
+        samples.append(elapsedNs)
+        self._counts[route] = self._counts.get(route, 0) + 1
+
+    def percentiles(self, points: tuple[float, ...] = (50, 90, 99)) -> dict[str, dict[str, float]]:
+        report: dict[str, dict[str, float]] = {}
+        for route, samples in self._samples.items():
+            ordered = sorted(samples)
+            stats: dict[str, float] = {"count": self._counts[route]}
+            for p in points:
+                index = min(len(ordered), max(1, math.ceil(p / 100 * len(ordered)))) - 1
+                stats[f"p{p:g}Ms"] = ordered[index] / 1e6
+            stats["maxMs"] = ordered[-1] / 1e6
+            report[route] = stats
+        return report
+
+
+type RouteHandler = Callable[[bytes, bool], Awaitable[Any]]
+
+
+class GachaHttpServer:
+    STATUS_TEXT: ClassVar[dict[int, str]] = {
+        200: "OK",
+        400: "Bad Request",
+        404: "Not Found",
+        405: "Method Not Allowed",
+        500: "Internal Server Error",
+    }
+
+    MSGPACK: ClassVar[str] = "application/msgpack"
+    PROMETHEUS: ClassVar[str] = "text/plain; version=0.0.4"
+
+    _requestDecoder: ClassVar[mscjson.Decoder] = mscjson.Decoder(GachaRequest)
+    _requestMsgpackDecoder: ClassVar[msgpack.Decoder] = msgpack.Decoder(GachaRequest)
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        showLog: bool = False,
+        enableMetrics: bool = False,
+        store: PlayerStateStore | None = None,
+        capacity: int = 10000,
+        watchTables: bool = False,
+    ) -> None:
+        self.host: str = host
+        self.port: int = port
+        self.showLog: bool = showLog
+        if enableMetrics:
+            metrics.enabled = True
+        self.latency: LatencyRecorder = LatencyRecorder()
+        self.gachaHost: GachaHost = GachaHost(store, capacity, showLog=showLog)
+        self.reloader: TableReloader | None = TableReloader() if watchTables else None
+        self._server: asyncio.Server | None = None
+        self._routes: dict[tuple[str, str], RouteHandler] = {
+            ("POST", "/gacha/single"): self._handleSingle,
+            ("POST", "/gacha/ten"): self._handleTen,
+            ("GET", "/stats/latency"): self._handleLatency,
+            ("GET", "/stats/stages"): self._handleStages,
+            ("GET", "/metrics"): self._handleMetrics,
+            ("GET", "/stats/tables"): self._handleTables,
+        }
+
+    async def start(self) -> None:
+        self.gachaHost.start()
+        if self.reloader is not None:
+            self.reloader.start()
+        self._server = await asyncio.start_server(self._handleConnection, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"gacha http server listening on {self.host}:{self.port}")
+
+    async def serveForever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.reloader is not None:
+            await self.reloader.close()
+        await self.gachaHost.close()
+
+    async def _handleSingle(self, body: bytes, binary: bool) -> GachaResponse:
+        req = self._decodeRequest(body, binary)
+        self._checkRequest(req)
+        result = await self.gachaHost.handleAdvancedGacha(req.playerId, req.poolId, req.useTkt)
+        return GachaResponse(playerId=req.playerId, poolId=req.poolId, result=[result])
+
+    async def _handleTen(self, body: bytes, binary: bool) -> GachaResponse:
+        req = self._decodeRequest(body, binary)
+        self._checkRequest(req)
+        result = await self.gachaHost.handleTenAdvancedGacha(req.playerId, req.poolId, req.useTkt, req.itemId)
+        return GachaResponse(playerId=req.playerId, poolId=req.poolId, result=result)
+
+    async def _handleLatency(self, body: bytes, binary: bool) -> dict[str, dict[str, float]]:
+        return self.latency.percentiles()
+
+    async def _handleStages(self, body: bytes, binary: bool) -> dict[str, dict[str, Any]]:
+        return metrics.snapshot()
+
+    async def _handleMetrics(self, body: bytes, binary: bool) -> bytes:
+        # 原始字节按 Prometheus 文本格式直接返回, 不经过 JSON/msgpack 编码
+        return metrics.prometheus().encode()
+
+    async def _handleTables(self, body: bytes, binary: bool) -> dict[str, Any]:
+        report = GachaTableRegistry.shared().report()
+        if self.reloader is not None:
+            report["lastReload"] = self.reloader.lastReport
+        return report
+
+    def _decodeRequest(self, body: bytes, binary: bool) -> GachaRequest:
+        try:
+            if binary:
+                return self._requestMsgpackDecoder.decode(body)
+            return self._requestDecoder.decode(body)
+        except (DecodeError, ValidationError) as e:
+            raise HttpError(400, str(e)) from e
+
+    def _checkRequest(self, req: GachaRequest) -> None:
+        try:
+            self.gachaHost.store.checkPlayerId(req.playerId)
+        except ValueError as e:
+            raise HttpError(400, str(e)) from e
+        self._checkPool(req.poolId)
+
+    @staticmethod
+    def _checkPool(poolId: str) -> None:
+        # 未知卡池与缺少服务端详情的卡池属于请求错误; 其余 KeyError 是内部错误, 交给 500 分支记录
+        tables = GachaTableRegistry.shared()
+        if poolId not in tables.Excel.gachaPoolClientById and poolId not in tables.Excel.newbeeGachaPoolIds:
+            raise HttpError(400, f"unknown gacha pool: {poolId}")
+        if poolId not in tables.Server.details:
+            raise HttpError(400, f"gacha pool {poolId} has no server details")
+
+    async def _handleConnection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    requestLine = await reader.readline()
+                except ConnectionError:
+                    break
+                if not requestLine.strip():
+                    break
+                start = time.perf_counter_ns()
+                method, target, _ = requestLine.decode("latin-1").split(" ", 2)
+                headers: dict[str, str] = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                path = urlsplit(target).path
+                # 请求体格式取自 Content-Type, 响应格式取自 Accept(缺省与请求体一致)
+                binaryRequest = self.MSGPACK in headers.get("content-type", "")
+                binaryResponse = self.MSGPACK in headers.get("accept", self.MSGPACK if binaryRequest else "")
+                status, payload, contentType = await self._dispatch(
+                    method.upper(), path, body, binaryRequest, binaryResponse
+                )
+                keepAlive = headers.get("connection", "keep-alive").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {self.STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: {contentType}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keepAlive else 'close'}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+                self.latency.record(f"{method.upper()} {path}", time.perf_counter_ns() - start)
+                if not keepAlive:
+                    break
+        except (asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(
+        self, method: str, path: str, body: bytes, binaryRequest: bool = False, binaryResponse: bool = False
+    ) -> tuple[int, bytes, str]:
+        encoder = msgpackEncoder if binaryResponse else jsonEncoder
+        contentType = self.MSGPACK if binaryResponse else "application/json"
+        if (handler := self._routes.get((method, path))) is None:
+            status = 405 if any(p == path for _, p in self._routes) else 404
+            return status, encoder.encode({"error": "route not found"}), contentType
+        try:
+            if isinstance(result := await handler(body, binaryRequest), bytes):
+                return 200, result, self.PROMETHEUS
+            return 200, encoder.encode(result), contentType
+        except HttpError as e:
+            return e.status, encoder.encode({"error": str(e)}), contentType
+        except ValueError as e:
+            return 400, encoder.encode({"error": str(e)}), contentType
+        except Exception as e:
+            logger.exception(e)
+            return 500, encoder.encode({"error": "internal server error"}), contentType
+
+
+async def request(
+    host: str, port: int, method: str, path: str, body: Any = None, binary: bool = False
+) -> tuple[int, Any]:
+    reader, writer = await asyncio.open_connection(host, port)
+    contentType = GachaHttpServer.MSGPACK if binary else "application/json"
+    try:
+        payload = b"" if body is None else (msgpack.encode(body) if binary else mscjson.encode(body))
+        writer.write(
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            f"Content-Type: {contentType}\r\n"
+            f"Accept: {contentType}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+        status = int((await reader.readline()).split(b" ", 2)[1])
+        headers: dict[str, str] = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        content = await reader.readexactly(int(headers.get("content-length", 0)))
+        if not content:
+            return status, None
+        if headers.get("content-type", "").startswith("text/plain"):
+            return status, content.decode()
+        return status, msgpack.decode(content) if binary else mscjson.decode(content)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Serve gacha pulls over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--metrics", action="store_true", help="record per-stage draw timings")
+    parser.add_argument("--state-dir", type=Path, help="persist player state under this directory")
+    parser.add_argument("--capacity", type=int, default=10000, help="players kept in memory before spilling")
+    parser.add_argument("--watch-tables", action="store_true", help="reload gacha tables when the json files change")
+    parser.add_argument("--lazy-details", action="store_true", help="decode pool details on first use")
+    args = parser.parse_args()
+    GachaTableRegistry.lazyDetails = args.lazy_details
+    store = FileStateStore(args.state_dir) if args.state_dir else None
+    asyncio.run(
+        GachaHttpServer(
+            args.host,
+            args.port,
+            enableMetrics=args.metrics,
+            store=store,
+            capacity=args.capacity,
+            watchTables=args.watch_tables,
+        ).serveForever()
+    )
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,136 @@
+from collections.abc import Callable
+from contextlib import AbstractContextManager, nullcontext
+import time
+from typing import Any, ClassVar
+
+
+class StageHistogram:
+    # 以 2 的幂划分纳秒桶, 上界为 128ns .. 2^30ns(约 1.07s), 末尾为溢出桶
+    __slots__ = ("buckets", "count", "totalNs", "maxNs")
+
+    BOUNDS: ClassVar[tuple[int, ...]] = tuple(1 << i for i in range(7, 31))
+
+    def __init__(self) -> None:
+        self.buckets: list[int] = [0] * (len(self.BOUNDS) + 1)
+        self.count: int = 0
+        self.totalNs: int = 0
+        self.maxNs: int = 0
+
+    def record(self, ns: int) -> None:
+        self.count += 1
+        self.totalNs += ns
+        if ns > self.maxNs:
+            self.maxNs = ns
+        self.buckets[min(max(ns.bit_length() - 7, 0), len(self.BOUNDS))] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "totalNs": self.totalNs,
+            "meanNs": self.totalNs / self.count if self.count else 0.0,
+            "maxNs": self.maxNs,
+            "buckets": {str(bound): n for bound, n in zip((*self.BOUNDS, "+Inf"), self.buckets) if n},
+        }
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: StageHistogram) -> None:
+        self.histogram: StageHistogram = histogram
+        self.start: int = 0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc: object) -> None:
+        self.histogram.record(time.perf_counter_ns() - self.start)
+
+
+class PullMetrics:
+    # 默认关闭; 关闭时 timed 直接返回原函数, stage 返回空上下文, 不产生计时开销
+    STAGES: ClassVar[tuple[str, ...]] = (
+        "initRule", "buildPool", "guaranteedRarity", "rarityHit", "drawChar", "postGacha", "batch",
+    )
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled: bool = enabled
+        self.histograms: dict[tuple[str, str], StageHistogram] = {}
+        self.pulls: dict[str, int] = {}
+        self.batches: dict[str, int] = {}
+
+    def reset(self) -> None:
+        self.histograms.clear()
+        self.pulls.clear()
+        self.batches.clear()
+
+    def histogram(self, ruleType: str, stage: str) -> StageHistogram:
+        if (histogram := self.histograms.get((ruleType, stage))) is None:
+            histogram = self.histograms[ruleType, stage] = StageHistogram()
+        return histogram
+
+    def stage(self, ruleType: str, stage: str) -> AbstractContextManager:
+        if not self.enabled:
+            return nullcontext()
+        return _StageTimer(self.histogram(ruleType, stage))
+
+    def timed[**P, R](self, ruleType: str, stage: str, func: Callable[P, R]) -> Callable[P, R]:
+        if not self.enabled:
+            return func
+        record = self.histogram(ruleType, stage).record
+        perfCounter = time.perf_counter_ns
+
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            start = perfCounter()
+            result = func(*args, **kwargs)
+            record(perfCounter() - start)
+            return result
+
+        return wrapper
+
+    def countBatch(self, ruleType: str, pulls: int) -> None:
+        self.pulls[ruleType] = self.pulls.get(ruleType, 0) + pulls
+        self.batches[ruleType] = self.batches.get(ruleType, 0) + 1
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        report: dict[str, dict[str, Any]] = {}
+        for ruleType in sorted(self.pulls.keys() | {r for r, _ in self.histograms}):
+            report[ruleType] = {
+                "pulls": self.pulls.get(ruleType, 0),
+                "batches": self.batches.get(ruleType, 0),
+                "stages": {
+                    stage: histogram.snapshot()
+                    for (r, stage), histogram in sorted(self.histograms.items())
+                    if r == ruleType
+                },
+            }
+        return report
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP gacha_pulls_total Pulls drawn per gacha rule type.",
+            "# TYPE gacha_pulls_total counter",
+        ]
+        lines += [f'gacha_pulls_total{{rule_type="{r}"}} {n}' for r, n in sorted(self.pulls.items())]
+        lines += [
+            "# HELP gacha_batches_total Draw batches (single or ten pulls) per gacha rule type.",
+            "# TYPE gacha_batches_total counter",
+        ]
+        lines += [f'gacha_batches_total{{rule_type="{r}"}} {n}' for r, n in sorted(self.batches.items())]
+        lines += [
+            "# HELP gacha_stage_seconds Time spent in each draw stage.",
+            "# TYPE gacha_stage_seconds histogram",
+        ]
+        for (ruleType, stage), histogram in sorted(self.histograms.items()):
+            labels = f'rule_type="{ruleType}",stage="{stage}"'
+            cumulative = 0
+            for bound, n in zip(histogram.BOUNDS, histogram.buckets):
+                cumulative += n
+                lines.append(f'gacha_stage_seconds_bucket{{{labels},le="{bound / 1e9:g}"}} {cumulative}')
+            lines.append(f'gacha_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"gacha_stage_seconds_sum{{{labels}}} {histogram.totalNs / 1e9:.9f}")
+            lines.append(f"gacha_stage_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = PullMetrics()
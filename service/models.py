@@ -1,9 +1,14 @@
+from collections.abc import Callable, Iterator, Mapping
 from enum import StrEnum
+from functools import cached_property
 from typing import Any
 
-from msgspec import Struct, field
+from .compactState import GainedChars, PullHistory
 
-type PoolResult = "list[list[tuple[list[float], list[PoolWeightItem]]]]"
+from msgspec import Raw, Struct, field
+
+type PoolResult = "list[list[tuple[list[float], list[PoolCatalogItem]]]]"
+type CatalogItems = "dict[tuple[str, int], PoolCatalogItem]"
 
 
 class RuleType(StrEnum):
@@ -73,7 +78,50 @@ class GachaDetailInfo(Struct):
 
 
 class GachaDetailTable(Struct):
-    details: dict[str, GachaDetailInfo]
+    details: Mapping[str, GachaDetailInfo]
+
+
+class RawGachaDetailTable(Struct):
+    details: dict[str, Raw]
+
+
+class LazyDetails(Mapping[str, GachaDetailInfo]):
+    # 各卡池详情保留为未解码的片段, 首次访问时才解码并缓存; 只服务当期卡池的进程不必解码全部历史卡池
+    __slots__ = ("_raw", "_decode", "_decoded")
+
+    def __init__(self, raw: dict[str, Raw], decode: Callable[[Raw], GachaDetailInfo]) -> None:
+        # 解码得到的片段引用整份源表缓冲区, 逐个复制后源表即可释放
+        self._raw: dict[str, Raw] = {poolId: fragment.copy() for poolId, fragment in raw.items()}
+        self._decode: Callable[[Raw], GachaDetailInfo] = decode
+        self._decoded: dict[str, GachaDetailInfo] = {}
+
+    def __getitem__(self, poolId: str) -> GachaDetailInfo:
+        if (detail := self._decoded.get(poolId)) is None:
+            # 并发首次访问时可能重复解码, 只保留先写入的一份
+            detail = self._decoded.setdefault(poolId, self._decode(self._raw[poolId]))
+        return detail
+
+    def __contains__(self, poolId: object) -> bool:
+        return poolId in self._raw
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    @property
+    def decodedCount(self) -> int:
+        return len(self._decoded)
+
+    def raw(self, poolId: str) -> Raw | None:
+        return self._raw.get(poolId)
+
+    def peek(self, poolId: str) -> GachaDetailInfo | None:
+        # 解码但不缓存, 供比对等一次性读取使用
+        if (detail := self._decoded.get(poolId)) is not None:
+            return detail
+        return self._decode(raw) if (raw := self._raw.get(poolId)) is not None else None
 
 
 class GachaDataLinkageTenGachaTkt(Struct):
@@ -201,9 +249,7 @@ class GachaDataFesGachaPoolRelateItem(Struct):
     rarityRank6ItemId: str
 
 
-class GachaTable(Struct):
-    __version__ = "24-03-29-14-33-44-5002d2"
-
+class GachaTable(Struct, dict=True):
     gachaTags: list[GachaTag]
     carousel: list[GachaDataCarouselData]
     classicPotentialMaterialConverter: PotentialMaterialConverterConfig
@@ -224,8 +270,52 @@ class GachaTable(Struct):
     potentialMats: dict | None = None
     classicPotentialMats: dict | None = None
 
+    def __post_init__(self) -> None:
+        self.gachaPoolClientById
+        self.newbeeGachaPoolClientById
+        self.newbeeGachaPoolIds
+        self.carouselByPoolId
+
+    @cached_property
+    def gachaPoolClientById(self) -> dict[str, GachaPoolClientData]:
+        return {p.gachaPoolId: p for p in self.gachaPoolClient}
+
+    @cached_property
+    def newbeeGachaPoolClientById(self) -> dict[str, NewbeeGachaPoolClientData]:
+        return {p.gachaPoolId: p for p in self.newbeeGachaPoolClient}
+
+    @cached_property
+    def newbeeGachaPoolIds(self) -> frozenset[str]:
+        return frozenset(self.newbeeGachaPoolClientById)
+
+    @cached_property
+    def carouselByPoolId(self) -> dict[str, GachaDataCarouselData]:
+        carouselById: dict[str, GachaDataCarouselData] = {}
+        for g in self.carousel:
+            carouselById.setdefault(g.poolId, g)
+        return carouselById
+
+
+class PoolCatalogItem(Struct, frozen=True, gc=False):
+    # 卡池候选项只读, 可按 (id, rarity) 在同一版本的表内复用; 抽中时才生成可由触发器修改的 PoolWeightItem
+    id_: str = field(name="id")
+    count: int
+    type_: str = field(name="type")
+    rarity: int
+
+    @classmethod
+    def char(cls, charId: str, rarity: int, interned: "CatalogItems | None" = None) -> "PoolCatalogItem":
+        if interned is None:
+            return cls(id_=charId, count=1, type_="CHAR", rarity=rarity)
+        if (item := interned.get(key := (charId, rarity))) is None:
+            item = interned[key] = cls(id_=charId, count=1, type_="CHAR", rarity=rarity)
+        return item
+
+    def hit(self) -> "PoolWeightItem":
+        return PoolWeightItem(self.id_, self.count, self.type_, self.rarity)
+
 
-class PoolWeightItem(Struct):
+class PoolWeightItem(Struct, gc=False):
     id_: str = field(name="id")
     count: int
     type_: str = field(name="type")
@@ -249,7 +339,7 @@ class PoolWeightItem(Struct):
 class gachaGroupConfig(Struct):
     normalCharCnt: int
     weights: list[float] = field(default_factory=list)
-    pool: list[PoolWeightItem] = field(default_factory=list)
+    pool: list[PoolCatalogItem] = field(default_factory=list)
     upChars_1: list[str] = field(default_factory=list)
     upChars_2: list[str] = field(default_factory=list)
     perUpWeight_1: float = field(default=0.0)
@@ -262,9 +352,9 @@ class GachaPoolInfo(Struct, omit_defaults=False):
     totalCnt: int = field(default=0)
     non6StarCnt: int = field(default=0)
     non5StarCnt: int = field(default=0)
-    gain5Star: list[str] = field(default_factory=list)
-    gain6Star: list[str] = field(default_factory=list)
-    history: list[str] = field(default_factory=list)
+    gain5Star: GainedChars = field(default_factory=GainedChars)
+    gain6Star: GainedChars = field(default_factory=GainedChars)
+    history: PullHistory = field(default_factory=PullHistory)
 
 
 class GachaTrackModel(Struct, omit_defaults=False):
@@ -1,13 +1,108 @@
+from collections import OrderedDict
+import random
 from typing import Any, cast, overload
 
+from .aliasTable import AliasTable
 from .models import (
+    CatalogItems,
     GachaDetailInfo,
+    GachaDetailTable,
     PlayerGacha,
+    PoolCatalogItem,
     PoolResult,
     PoolWeightItem,
     gachaGroupConfig,
 )
 
+from msgspec import Struct
+
+type FesSelection = tuple[tuple[str, tuple[str, ...]], ...]
+
+
+class CompiledPoolGroup(Struct, frozen=True):
+    weights: tuple[float, ...]
+    items: tuple[PoolCatalogItem, ...]
+    table: AliasTable
+    # 候选角色 id, 与 items 同序; 供寻访保底等只需要 id 的触发器使用
+    ids: tuple[str, ...]
+    # 同一批 id 的集合, 用于按玩家已拥有角色取差集
+    idSet: frozenset[str]
+
+    def draw(self, rng: random.Random) -> PoolWeightItem:
+        return self.items[self.table.sample(rng)].hit()
+
+
+class CompiledPool(Struct, frozen=True):
+    groups: tuple[CompiledPoolGroup | None, ...]
+
+    def draw(self, rarity: int, rng: random.Random) -> PoolWeightItem:
+        if (group := self.groups[rarity]) is None:
+            raise IndexError(f"no candidates for rarity {rarity}")
+        return group.draw(rng)
+
+    def candidates(self, rarity: int) -> tuple[str, ...]:
+        return group.ids if (group := self.groups[rarity]) is not None else ()
+
+    def candidateSet(self, rarity: int) -> frozenset[str]:
+        return group.idSet if (group := self.groups[rarity]) is not None else frozenset()
+
+
+class CompiledPoolCache:
+    def __init__(self, details: GachaDetailTable, maxSelections: int = 1024) -> None:
+        self.details: GachaDetailTable = details
+        self.maxSelections: int = maxSelections
+        # 各卡池的默认编译结果常驻; FES 选择(包括空选择)单独成键, 按玩家选择产生, 按最近使用保留至多 maxSelections 个
+        self._pools: dict[str, CompiledPool] = {}
+        self._selections: OrderedDict[tuple[str, FesSelection], CompiledPool] = OrderedDict()
+        # 本版本表内复用的候选项, 随注册表一同释放
+        self._items: CatalogItems = {}
+
+    def get(self, poolId: str, fesUpChar: dict[str, list[str]] | None = None) -> CompiledPool:
+        if fesUpChar is None:
+            if (compiled := self._pools.get(poolId)) is None:
+                compiled = self._pools[poolId] = PoolGenerator.compile(self.details.details[poolId], interned=self._items)
+            return compiled
+
+        key = (poolId, self._selectionKey(fesUpChar))
+        if (compiled := self._selections.get(key)) is not None:
+            self._selections.move_to_end(key)
+            return compiled
+        compiled = self._selections[key] = PoolGenerator.compile(self.details.details[poolId], fesUpChar, self._items)
+        while len(self._selections) > self.maxSelections:
+            self._selections.popitem(last=False)
+        return compiled
+
+    def warm(self) -> None:
+        for poolId in self.details.details:
+            self.get(poolId)
+
+    def preload(self, pools: dict[str, CompiledPool]) -> None:
+        # 预处理文件中已编译的默认卡池, 省去启动后首次抽卡时的编译
+        self._pools.update(pools)
+        for compiled in pools.values():
+            for group in compiled.groups:
+                if group is not None:
+                    self._items.update(((item.id_, item.rarity), item) for item in group.items)
+
+    def invalidate(self, poolId: str | None = None, fesUpChar: dict[str, list[str]] | None = None) -> None:
+        if poolId is None:
+            self._pools.clear()
+            self._selections.clear()
+            self._items.clear()
+        elif fesUpChar is not None:
+            self._selections.pop((poolId, self._selectionKey(fesUpChar)), None)
+        else:
+            self._pools.pop(poolId, None)
+            for key in [k for k in self._selections if k[0] == poolId]:
+                del self._selections[key]
+
+    def __len__(self) -> int:
+        return len(self._pools) + len(self._selections)
+
+    @staticmethod
+    def _selectionKey(fesUpChar: dict[str, list[str]]) -> FesSelection:
+        return tuple(sorted((rarity, tuple(chars)) for rarity, chars in fesUpChar.items()))
+
 
 class PoolGenerator:
     @overload
@@ -20,14 +115,52 @@ class PoolGenerator:
 
     @classmethod
     async def build(cls, *args) -> PoolResult: # type: ignore[overload-overlap]
+        return cls.buildSync(*args)
+
+    @overload
+    @classmethod
+    def buildSync(cls, detail: GachaDetailInfo, /) -> PoolResult: ...
+
+    @overload
+    @classmethod
+    def buildSync(cls, detail: GachaDetailInfo, poolId: str, player_data: Any, /) -> PoolResult: ...
+
+    @classmethod
+    def buildSync(cls, *args) -> PoolResult: # type: ignore[overload-overlap]
         if len(args) == 1:
-            return await cls._buildAdvancedPool(*args)
+            return cls._buildAdvancedPool(*args)
         if len(args) == 3:
-            return await cls._buildFesCustomPool(*args)
+            detail, poolId, player_data = args
+            return cls._buildFesCustomPool(poolId, detail, player_data)
         raise TypeError("PoolGenerator.build invalid arguments")
 
     @classmethod
-    async def _buildAdvancedPool(cls, detail: GachaDetailInfo) -> PoolResult:
+    def compile(
+        cls, detail: GachaDetailInfo, fesUpChar: dict[str, list[str]] | None = None, interned: CatalogItems | None = None
+    ) -> CompiledPool:
+        if fesUpChar is None:
+            gachaPool = cls._buildAdvancedPool(detail, interned)
+        else:
+            gachaPool = cls._buildFesUpCharPool(detail, fesUpChar, interned)
+        groups: list[CompiledPoolGroup | None] = []
+        for rarityGroups in gachaPool:
+            if not rarityGroups:
+                groups.append(None)
+                continue
+            weights, pool = rarityGroups[0]
+            groups.append(
+                CompiledPoolGroup(
+                    weights=tuple(weights),
+                    items=tuple(pool),
+                    table=AliasTable.build(weights),
+                    ids=(ids := tuple(item.id_ for item in pool)),
+                    idSet=frozenset(ids),
+                )
+            )
+        return CompiledPool(groups=tuple(groups))
+
+    @classmethod
+    def _buildAdvancedPool(cls, detail: GachaDetailInfo, interned: CatalogItems | None = None) -> PoolResult:
         result = cast(PoolResult, [[] for _ in range(6)])
         for group in detail.availCharInfo.perAvailList:
             conf = gachaGroupConfig(normalCharCnt=len(group.charIdList))
@@ -47,13 +180,7 @@ class PoolGenerator:
                     conf.perUpWeight_2 = conf.totalWeights / (conf.normalCharCnt + len(conf.upChars_2) * rate) * rate
                     conf.totalWeights -= conf.perUpWeight_2 * len(conf.upChars_2)
             for charId in group.charIdList:
-                weightObj = PoolWeightItem(
-                    id_=charId,
-                    count=1,
-                    type_="CHAR",
-                    rarity=group.rarityRank
-                )
-                conf.pool.append(weightObj)
+                conf.pool.append(PoolCatalogItem.char(charId, group.rarityRank, interned))
                 if charId in conf.upChars_1:
                     conf.weights.append(conf.perUpWeight_1)
                 elif charId in conf.upChars_2:
@@ -63,27 +190,27 @@ class PoolGenerator:
             result[group.rarityRank].append((conf.weights, conf.pool))
         return result
 
+    @classmethod
+    def _buildFesCustomPool(
+        cls, poolId: str, detail: GachaDetailInfo, player_data: PlayerGacha
+    ) -> PoolResult:
+        upChar = info.upChar if (info := player_data.fesClassic.get(poolId)) else {}
+        return cls._buildFesUpCharPool(detail, upChar)
+
     @staticmethod
-    async def _buildFesCustomPool(
-        poolId: str, detail: GachaDetailInfo, player_data: PlayerGacha
+    def _buildFesUpCharPool(
+        detail: GachaDetailInfo, upChar: dict[str, list[str]], interned: CatalogItems | None = None
     ) -> PoolResult:
         result = cast(PoolResult, [[] for _ in range(6)])
         for group in detail.availCharInfo.perAvailList:
             conf = gachaGroupConfig(normalCharCnt=len(group.charIdList))
-            if info := player_data.fesClassic:
-                if upGroup := info[poolId].upChar.get(str(group.rarityRank)):
-                    conf.upChars_1 = upGroup[:]
-                    conf.perUpWeight_1 = 0.25 if group.rarityRank == 5 else 0.166667
-                    conf.normalCharCnt -= len(conf.upChars_1)
-                    conf.totalWeights -= conf.perUpWeight_1 * len(conf.upChars_1)
+            if upGroup := upChar.get(str(group.rarityRank)):
+                conf.upChars_1 = upGroup[:]
+                conf.perUpWeight_1 = 0.25 if group.rarityRank == 5 else 0.166667
+                conf.normalCharCnt -= len(conf.upChars_1)
+                conf.totalWeights -= conf.perUpWeight_1 * len(conf.upChars_1)
             for charId in group.charIdList:
-                weightObj = PoolWeightItem(
-                    id_=charId,
-                    count=1,
-                    type_="CHAR",
-                    rarity=group.rarityRank
-                )
-                conf.pool.append(weightObj)
+                conf.pool.append(PoolCatalogItem.char(charId, group.rarityRank, interned))
                 if charId in conf.upChars_1:
                     conf.weights.append(conf.perUpWeight_1)
                 else:
@@ -0,0 +1,208 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+import time
+from typing import ClassVar
+
+from .models import PoolWeightItem
+
+from loguru import logger
+from msgspec import json as mscjson
+
+
+class PullEventRing:
+    # 定长字节环形缓冲区, 每条事件为一行预编码的 JSON; 写满时 push 返回 False, 由调用方先腾出空间
+    def __init__(self, capacity: int = 1 << 20) -> None:
+        self.capacity: int = capacity
+        self.buffer: bytearray = bytearray(capacity)
+        self._view: memoryview = memoryview(self.buffer)
+        self.head: int = 0
+        self.tail: int = 0
+        self.events: int = 0
+
+    def __len__(self) -> int:
+        return self.head - self.tail
+
+    def push(self, record: bytes | bytearray) -> bool:
+        size = len(record)
+        if size > self.capacity - len(self):
+            return False
+        start = self.head % self.capacity
+        if (end := start + size) <= self.capacity:
+            self._view[start:end] = record
+        else:
+            first = self.capacity - start
+            self._view[start:] = record[:first]
+            self._view[:size - first] = record[first:]
+        self.head += size
+        self.events += 1
+        return True
+
+    def drain(self) -> bytes:
+        if not (size := len(self)):
+            return b""
+        start = self.tail % self.capacity
+        if (end := start + size) <= self.capacity:
+            payload = bytes(self._view[start:end])
+        else:
+            payload = bytes(self._view[start:]) + bytes(self._view[:end - self.capacity])
+        self.tail = self.head
+        return payload
+
+
+# 返回 False 表示没有任何输出接收这批事件, PullLogger 会暂停采集
+type PullLogSink = Callable[[bytes], Awaitable[bool | None]]
+
+
+def loguruSink(level: str = "DEBUG") -> PullLogSink:
+    async def sink(payload: bytes) -> bool:
+        accepted = False
+
+        def render() -> str:
+            nonlocal accepted
+            accepted = True
+            return payload.decode().rstrip()
+
+        # lazy: 没有 handler 接收该级别时 render 不会被调用
+        logger.opt(lazy=True).log(level, "pull events:\n{}", render)
+        return accepted
+
+    return sink
+
+
+def fileSink(path: Path) -> PullLogSink:
+    def write(payload: bytes) -> None:
+        with path.open("ab") as f:
+            f.write(payload)
+
+    async def sink(payload: bytes) -> None:
+        await asyncio.to_thread(write, payload)
+
+    return sink
+
+
+class PullLogger:
+    # 每条事件一行 JSON: {"ts","ruleType","poolId","totalCnt","charId","rarity","beforeNonHitCnt"}
+    _encoder: ClassVar[mscjson.Encoder] = mscjson.Encoder()
+    _line: ClassVar[bytes] = b'{"ts":%d,%s,"totalCnt":%d,"charId":%s,"rarity":%d,"beforeNonHitCnt":%d}\n'
+
+    def __init__(
+        self,
+        sink: PullLogSink | None = None,
+        level: str = "DEBUG",
+        capacity: int = 1 << 20,
+        flushInterval: float = 0.1,
+        probeInterval: float = 5.0,
+    ) -> None:
+        self.sink: PullLogSink = sink or loguruSink(level)
+        self.flushInterval: float = flushInterval
+        self.probeInterval: float = probeInterval
+        self.ring: PullEventRing = PullEventRing(capacity)
+        # 环形缓冲区写满时移交给刷新任务的内容, 按顺序先于环形缓冲区写出
+        self._overflow: list[bytes] = []
+        self._mutedUntil: float = 0.0
+        # 已转义的字符串片段, 按卡池与角色缓存, 每条事件只格式化一次
+        self._poolFragments: dict[tuple[str, str], bytes] = {}
+        self._charFragments: dict[str, bytes] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._flushTask: asyncio.Task | None = None
+        self._flushLock: asyncio.Lock | None = None
+        self._noLoop: bool = False
+        self._warnedOverflow: bool = False
+
+    def enabled(self) -> bool:
+        # sink 报告无人接收后暂停采集, 每 probeInterval 秒放行一批重新试探 sink 的级别
+        return time.monotonic() >= self._mutedUntil
+
+    def backlogged(self) -> bool:
+        return bool(self._overflow)
+
+    def emit(self, ruleType: str, poolId: str, totalCnt: int, charHit: PoolWeightItem) -> None:
+        if (poolFragment := self._poolFragments.get((ruleType, poolId))) is None:
+            poolFragment = self._poolFragments[ruleType, poolId] = (
+                b'"ruleType":' + self._encoder.encode(ruleType) + b',"poolId":' + self._encoder.encode(poolId)
+            )
+        if (charFragment := self._charFragments.get(charId := charHit.id_)) is None:
+            charFragment = self._charFragments[charId] = self._encoder.encode(charId)
+        line = self._line % (time.time_ns(), poolFragment, totalCnt, charFragment, charHit.rarity, charHit.beforeNonHitCnt)
+        if not self.ring.push(line):
+            self._spill(line)
+
+        halfFull = len(self.ring) * 2 >= self.ring.capacity
+        if self._noLoop:
+            # 已知没有事件循环, 只在缓冲区过半时重新检查并就地写出
+            if halfFull:
+                self._start()
+        elif self._flushTask is None or self._flushTask.done():
+            self._start()
+        elif halfFull and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _spill(self, line: bytes) -> None:
+        # 不丢事件: 把环形缓冲区的内容移交给刷新任务, 异步调用方在本批结束后 await flush() 形成背压
+        if not self._warnedOverflow:
+            self._warnedOverflow = True
+            logger.warning(f"pull log ring is full (capacity {self.ring.capacity} bytes), waiting for the sink")
+        self._overflow.append(self.ring.drain())
+        if not self.ring.push(line):
+            self._overflow.append(line)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _take(self) -> bytes:
+        if not self._overflow:
+            return self.ring.drain()
+        self._overflow.append(self.ring.drain())
+        payload = b"".join(self._overflow)
+        self._overflow.clear()
+        return payload
+
+    def flushSync(self) -> None:
+        # 没有事件循环的调用方(同步 draw、脚本)在此就地写出
+        if payload := self._take():
+            asyncio.run(self._write(payload))
+
+    async def _write(self, payload: bytes) -> None:
+        if await self.sink(payload) is False:
+            self._mutedUntil = time.monotonic() + self.probeInterval
+
+    def _start(self) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            if not self._noLoop:
+                self._noLoop = True
+                logger.warning("pull log has no running event loop, flushing synchronously; call flushSync() when done")
+            if len(self.ring) * 2 >= self.ring.capacity:
+                self.flushSync()
+            return
+        self._noLoop = False
+        self._wakeup = asyncio.Event()
+        self._flushLock = asyncio.Lock()
+        self._flushTask = asyncio.create_task(self._flushLoop())
+
+    async def _flushLoop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flushInterval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._flushLock is None:
+            self._flushLock = asyncio.Lock()
+        async with self._flushLock:
+            if payload := self._take():
+                await self._write(payload)
+
+    async def close(self) -> None:
+        if self._flushTask is not None:
+            self._flushTask.cancel()
+            self._flushTask = None
+        await self.flush()
+
+
+pullLog = PullLogger()
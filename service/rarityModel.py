@@ -0,0 +1,126 @@
+from typing import ClassVar
+from weakref import WeakKeyDictionary
+
+from .tableRegistry import GachaTableRegistry
+
+from msgspec import Struct
+import numpy as np
+
+
+class RarityDistribution(Struct, frozen=True):
+    poolId: str
+    pulls: int
+    initialNon6StarCnt: int
+    expectedFirst6Star: float
+    expectedFirst5Star: float
+    rarityRates: list[list[float]]
+    first6StarCdf: list[float]
+    first5StarCdf: list[float]
+
+
+class RarityModel:
+    # 状态为 (是否仍有首次5星保底, non6StarCnt, non5StarCnt), 计数在概率饱和后截断
+    # 按注册表分别缓存, 热更新换下的旧表被回收时一并释放
+    _models: ClassVar[WeakKeyDictionary[GachaTableRegistry, dict[str, "RarityModel"]]] = WeakKeyDictionary()
+
+    def __init__(self, poolId: str, tables: GachaTableRegistry) -> None:
+        if poolId in tables.Excel.newbeeGachaPoolIds:
+            raise ValueError("newbee gacha pools are not supported by the rarity model")
+        if (poolClient := tables.Excel.gachaPoolClientById.get(poolId)) is None:
+            raise ValueError("invalid gacha pool id")
+
+        self.poolId: str = poolId
+        self.guarantee5Avail: bool = bool(poolClient.guarantee5Avail)
+        self.guarantee5Count: int = poolClient.guarantee5Count
+
+        # 复用引擎共享的稀有度权重表, 计数超出 cap 后权重不再变化
+        rarityTable = tables.rarity.get(poolId)
+        self.cap6: int = rarityTable.cap6
+        self.cap5: int = rarityTable.cap5
+
+        probs = np.zeros((self.cap6 + 1, self.cap5 + 1, 6))
+        for n6 in range(self.cap6 + 1):
+            for n5 in range(self.cap5 + 1):
+                weights = np.maximum(rarityTable.weightsAt(n6, n5), 0)
+                probs[n6, n5] = weights / weights.sum()
+        self.probs: np.ndarray = probs
+        self._distributions: dict[tuple[int, int], RarityDistribution] = {}
+
+    @classmethod
+    def forPool(cls, poolId: str, tables: GachaTableRegistry | None = None) -> "RarityModel":
+        tables = tables or GachaTableRegistry.shared()
+        if (models := cls._models.get(tables)) is None:
+            models = cls._models[tables] = {}
+        if (model := models.get(poolId)) is None:
+            model = models[poolId] = cls(poolId, tables)
+        return model
+
+    @classmethod
+    def distribution(cls, poolId: str, pulls: int = 300, initialNon6StarCnt: int = 0) -> RarityDistribution:
+        return cls.forPool(poolId).solve(pulls, initialNon6StarCnt)
+
+    def solve(self, pulls: int = 300, initialNon6StarCnt: int = 0) -> RarityDistribution:
+        key = (pulls, initialNon6StarCnt)
+        if (result := self._distributions.get(key)) is None:
+            result = self._distributions[key] = self._solve(pulls, initialNon6StarCnt)
+        return result
+
+    def _solve(self, pulls: int, initialNon6StarCnt: int) -> RarityDistribution:
+        # 截断后的计数在 cap 步内必然出货, 因此该长度足以得到精确期望
+        horizon = max(pulls, self.cap6 + self.cap5 + 2)
+        rates, _ = self._propagate(horizon, initialNon6StarCnt, None)
+        _, first6 = self._propagate(horizon, initialNon6StarCnt, 5)
+        _, first5 = self._propagate(horizon, initialNon6StarCnt, 4)
+        return RarityDistribution(
+            poolId=self.poolId,
+            pulls=pulls,
+            initialNon6StarCnt=initialNon6StarCnt,
+            expectedFirst6Star=self._expectation(first6),
+            expectedFirst5Star=self._expectation(first5),
+            rarityRates=rates[:pulls].tolist(),
+            first6StarCdf=np.cumsum(first6)[:pulls].tolist(),
+            first5StarCdf=np.cumsum(first5)[:pulls].tolist(),
+        )
+
+    def _propagate(self, horizon: int, initialNon6StarCnt: int, absorb: int | None) -> tuple[np.ndarray, np.ndarray]:
+        dist = np.zeros((2, self.cap6 + 1, self.cap5 + 1))
+        dist[int(self.guarantee5Avail), min(initialNon6StarCnt, self.cap6), 0] = 1.0
+        rates = np.zeros((horizon, 6))
+        absorbed = np.zeros(horizon)
+
+        guaranteed = self.probs.copy()
+        guaranteed[..., 4] += guaranteed[..., :4].sum(axis=-1)
+        guaranteed[..., :4] = 0
+
+        for pull in range(horizon):
+            probs = np.stack((self.probs, guaranteed if pull + 1 == self.guarantee5Count else self.probs))
+            mass = dist[..., None] * probs
+            rates[pull] = mass.sum(axis=(0, 1, 2))
+
+            miss = mass[..., :4].sum(axis=-1)
+            hit5 = mass[..., 4].sum(axis=(0, 2))
+            hit6 = mass[..., 5].sum()
+
+            dist = np.zeros_like(dist)
+            dist[:, 1:, 1:] += miss[:, :-1, :-1]
+            dist[:, -1, 1:] += miss[:, -1, :-1]
+            dist[:, 1:, -1] += miss[:, :-1, -1]
+            dist[:, -1, -1] += miss[:, -1, -1]
+            match absorb:
+                case None:
+                    dist[0, 1:, 1] += hit5[:-1]
+                    dist[0, -1, 1] += hit5[-1]
+                    dist[0, 0, 0] += hit6
+                case 5:
+                    dist[0, 1:, 1] += hit5[:-1]
+                    dist[0, -1, 1] += hit5[-1]
+                    absorbed[pull] = hit6
+                case _:
+                    absorbed[pull] = hit5.sum() + hit6
+        return rates, absorbed
+
+    @staticmethod
+    def _expectation(pmf: np.ndarray) -> float:
+        if (total := pmf.sum()) < 1 - 1e-9:
+            return float("inf")
+        return float((pmf * np.arange(1, len(pmf) + 1)).sum() / total)
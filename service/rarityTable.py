@@ -0,0 +1,132 @@
+from bisect import bisect
+from itertools import accumulate
+import random
+from typing import ClassVar
+
+from .models import GachaDetailTable
+
+from msgspec import Struct
+
+
+class RarityTable(Struct, frozen=True):
+    # 稀有度权重只取决于基础权重与 (non6StarCnt, non5StarCnt); 计数低于 floor 时没有递增,
+    # 高于 cap 时权重已饱和, 因此只需保存两者之间的网格
+    RIT5_UP_CNT_1: ClassVar[int] = 15
+    RIT5_UP_CNT_2: ClassVar[int] = 20
+    RIT6_UP_CNT: ClassVar[int] = 50
+
+    baseWeights: tuple[float, ...]
+    floor6: int
+    floor5: int
+    cap6: int
+    cap5: int
+    weights: tuple[tuple[float, ...], ...]
+    thresholds: tuple[tuple[float, ...], ...]
+
+    @classmethod
+    def build(cls, baseWeights: list[float]) -> "RarityTable":
+        floor6, floor5 = cls.RIT6_UP_CNT - 1, cls.RIT5_UP_CNT_1 - 1
+        cap6 = max(cls._saturation(baseWeights, 5, cls.RIT6_UP_CNT), floor6)
+        cap5 = max(cls._saturation(baseWeights, 4, cls.RIT5_UP_CNT_2), floor5, 1)
+        weights = tuple(
+            tuple(cls.rarityWeights(baseWeights, n6, n5))
+            for n6 in range(floor6, cap6 + 1)
+            for n5 in range(floor5, cap5 + 1)
+        )
+        return cls(
+            baseWeights=tuple(baseWeights),
+            floor6=floor6,
+            floor5=floor5,
+            cap6=cap6,
+            cap5=cap5,
+            weights=weights,
+            # 与 random.choices 相同的累积方式, 同一随机序列下结果一致
+            thresholds=tuple(tuple(accumulate(w)) for w in weights),
+        )
+
+    def index(self, non6StarCnt: int, non5StarCnt: int) -> int:
+        row = min(max(non6StarCnt, self.floor6), self.cap6) - self.floor6
+        col = min(max(non5StarCnt, self.floor5), self.cap5) - self.floor5
+        return row * (self.cap5 - self.floor5 + 1) + col
+
+    def weightsAt(self, non6StarCnt: int, non5StarCnt: int) -> tuple[float, ...]:
+        return self.weights[self.index(non6StarCnt, non5StarCnt)]
+
+    def roll(self, non6StarCnt: int, non5StarCnt: int, rng: random.Random) -> int:
+        cumWeights = self.thresholds[self.index(non6StarCnt, non5StarCnt)]
+        return bisect(cumWeights, rng.random() * cumWeights[-1], 0, 5)
+
+    @classmethod
+    def rarityWeights(cls, baseWeights: list[float], non6StarCnt: int, non5StarCnt: int) -> list[float]:
+        rarityWeights = baseWeights[:]
+
+        add6StarWeight = 0.0
+        if non6StarCnt >= cls.RIT6_UP_CNT:
+            add6StarWeight += rarityWeights[5] * (1 + non6StarCnt - cls.RIT6_UP_CNT)
+            if rarityWeights[5] + add6StarWeight > 1:
+                add6StarWeight = 1 - rarityWeights[5]
+            rarityWeights[5] += add6StarWeight
+
+        add5StarWeight = 0.0
+        if (cnt51 := min(1 + non5StarCnt - cls.RIT5_UP_CNT_1, 5)) > 0:
+            add5StarWeight += rarityWeights[4] * cnt51 * 0.25
+        if (cnt52 := 1 + non5StarCnt - cls.RIT5_UP_CNT_2) >= 0:
+            add5StarWeight += rarityWeights[4] * cnt52 * 0.5
+        rarityWeights[4] += add5StarWeight
+
+        totalWeight = 0.0
+        for i in range(5, -1, -1):
+            rarityWeights[i] = min(rarityWeights[i], 1 - totalWeight)
+            totalWeight += rarityWeights[i]
+        rarityWeights[2] = max(0, 1 - sum(rarityWeights[3:6]))
+        return rarityWeights
+
+    @classmethod
+    def _saturation(cls, baseWeights: list[float], rarity: int, start: int) -> int:
+        # 该稀有度及以上的权重合计达到 1 后, 计数继续增加不再改变权重
+        if not baseWeights[rarity]:
+            return start
+        cnt = start
+        while True:
+            if rarity == 5:
+                weights = cls.rarityWeights(baseWeights, cnt, 0)
+            else:
+                weights = cls.rarityWeights(baseWeights, 0, cnt)
+            if sum(weights[rarity:]) >= 1 - 1e-12:
+                return cnt
+            cnt += 1
+
+
+class RarityTableCache:
+    # 按卡池缓存, 基础权重相同的卡池共用同一张表
+    def __init__(self, details: GachaDetailTable) -> None:
+        self.details: GachaDetailTable = details
+        self._byPoolId: dict[str, RarityTable] = {}
+        self._byBase: dict[tuple[float, ...], RarityTable] = {}
+
+    @staticmethod
+    def baseWeights(details: GachaDetailTable, poolId: str) -> list[float]:
+        perAvailList = details.details[poolId].availCharInfo.perAvailList
+        return [0.0] * 2 + [i.totalPercent for i in reversed(perAvailList)]
+
+    def get(self, poolId: str) -> RarityTable:
+        if (table := self._byPoolId.get(poolId)) is None:
+            baseWeights = self.baseWeights(self.details, poolId)
+            if (table := self._byBase.get(key := tuple(baseWeights))) is None:
+                table = self._byBase[key] = RarityTable.build(baseWeights)
+            self._byPoolId[poolId] = table
+        return table
+
+    def preload(self, tables: list[RarityTable]) -> None:
+        for table in tables:
+            self._byBase[table.baseWeights] = table
+
+    def tables(self) -> list[RarityTable]:
+        return list(self._byBase.values())
+
+    def warm(self) -> None:
+        for poolId in self.details.details:
+            self.get(poolId)
+
+    def __len__(self) -> int:
+        return len(self._byBase)
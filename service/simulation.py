@@ -0,0 +1,237 @@
+import argparse
+from typing import ClassVar
+
+from .gachaLogic import GachaService
+from .gachaRules import AttainRule
+from .models import RuleType
+from .poolGenerator import CompiledPoolGroup
+from .tableRegistry import GachaTableRegistry
+
+from msgspec import Struct, json as mscjson
+import numpy as np
+
+
+class SimulationResult(Struct):
+    poolId: str
+    players: int
+    pulls: int
+    seed: int | None
+    rarityRates: list[list[float]]
+    pullsToFirst6Star: list[int]
+    pullsToFirst5Star: list[int]
+    pullsToTarget: list[int]
+    targetChars: list[str]
+
+
+class GachaSimulator:
+    # 逐稀有度向量化模拟, 与 GachaService._drawBatch 的行为一致: 5★/6★ 保底、60/200 抽 up 角色补齐
+    # 以及寻访卡池前 N 个 6★ 的替换; SINGLE 卡池的 150 抽计数不会小于 0, 不改写结果.
+    # 不支持新手卡池、按玩家选择 up 的 FESCLASSIC 卡池与会强制改写稀有度的 LINKAGE 卡池, 这些卡池请用 simulationRunner
+    RIT5_UP_CNT_1: ClassVar[int] = GachaService.RIT5_UP_CNT_1
+    RIT5_UP_CNT_2: ClassVar[int] = GachaService.RIT5_UP_CNT_2
+    RIT6_UP_CNT: ClassVar[int] = GachaService.RIT6_UP_CNT
+
+    def __init__(self, poolId: str, tables: GachaTableRegistry | None = None) -> None:
+        self.tables: GachaTableRegistry = tables or GachaTableRegistry.shared()
+        if poolId in self.tables.Excel.newbeeGachaPoolIds:
+            raise ValueError("newbee gacha pools are not supported by the simulator")
+        if (poolClient := self.tables.Excel.gachaPoolClientById.get(poolId)) is None:
+            raise ValueError("invalid gacha pool id")
+        if poolClient.gachaRuleType == RuleType.FESCLASSIC:
+            raise ValueError("FESCLASSIC pools depend on per-player up selections")
+        if poolClient.gachaRuleType == RuleType.LINKAGE:
+            raise ValueError("LINKAGE pools force per-player guarantees, use service.simulationRunner instead")
+
+        self.poolId: str = poolId
+        self.detail = self.tables.Server.details[poolId]
+        self.guarantee5Avail: bool = bool(poolClient.guarantee5Avail)
+        self.guarantee5Count: int = poolClient.guarantee5Count
+
+        rule = self.tables.rules.get(poolId)
+        # 寻访卡池前 N 个 6★ 在全部 6★ 候选中均匀替换
+        self.attain6Count: int = 0
+        if isinstance(rule, AttainRule):
+            self.attain6Count = (poolClient.dynMeta or {}).get("attainRare6Num", 0)
+        # 稀有度 -> (起始抽数, up 角色): 达到抽数后抽中该稀有度时补齐尚未获得的 up 角色
+        self.upRedirect: dict[int, tuple[int, list[str]]] = {}
+        if rule.upCharEnsure and (info := self.detail.upCharInfo) and info.perCharList:
+            if info.perCharList[-1].rarityRank == 4:
+                self.upRedirect[4] = (60, info.perCharList[-1].charIdList)
+            if info.perCharList[0].rarityRank == 5:
+                self.upRedirect[5] = (200, info.perCharList[0].charIdList)
+
+        perAvailList = self.detail.availCharInfo.perAvailList
+        self.baseWeights = np.zeros(6)
+        for group in perAvailList:
+            self.baseWeights[group.rarityRank] = group.totalPercent
+
+    def defaultTargets(self) -> list[str]:
+        if (info := self.detail.upCharInfo) and info.perCharList:
+            return list(info.perCharList[0].charIdList)
+        return []
+
+    def run(
+        self,
+        players: int,
+        pulls: int,
+        seed: int | None = None,
+        targets: list[str] | None = None,
+        initialNon6StarCnt: int = 0,
+    ) -> SimulationResult:
+        rng = np.random.default_rng(seed)
+        compiled = self.tables.pools.get(self.poolId)
+        targetChars = self.defaultTargets() if targets is None else targets
+
+        # 每个稀有度下各候选的目标位图, 以及在该稀有度 up 角色中的下标(-1 表示不是 up 角色)
+        groups: dict[int, tuple[CompiledPoolGroup, np.ndarray, np.ndarray]] = {}
+        for r, group in enumerate(compiled.groups):
+            if group is None:
+                continue
+            upChars = self.upRedirect[r][1] if r in self.upRedirect else []
+            groups[r] = (
+                group,
+                np.array([self._targetBit(targetChars, i) for i in group.ids], dtype=np.int64),
+                np.array([upChars.index(i) if i in upChars else -1 for i in group.ids], dtype=np.int64),
+            )
+        upTargetBits = {
+            r: np.array([self._targetBit(targetChars, i) for i in upChars], dtype=np.int64)
+            for r, (_, upChars) in self.upRedirect.items()
+        }
+        targetMask = (1 << len(targetChars)) - 1
+        trackChars = bool(targetMask or self.upRedirect)
+
+        non6 = np.full(players, initialNon6StarCnt, dtype=np.int64)
+        non5 = np.zeros(players, dtype=np.int64)
+        cnt = np.zeros(players, dtype=np.int64)
+        avail = np.full(players, self.guarantee5Avail)
+        owned = np.zeros(players, dtype=np.int64)
+        gainedUp = {r: np.zeros(players, dtype=np.int64) for r in self.upRedirect}
+        attainLeft = np.full(players, self.attain6Count, dtype=np.int64)
+
+        first6 = np.full(players, -1, dtype=np.int64)
+        first5 = np.full(players, -1, dtype=np.int64)
+        firstTarget = np.full(players, -1, dtype=np.int64)
+        rarityCounts = np.zeros((pulls, 6), dtype=np.int64)
+
+        for pull in range(pulls):
+            weights = self._rarityWeights(non6, non5)
+            cum = np.cumsum(weights, axis=1)
+            u = rng.random(players) * cum[:, -1]
+            rarity = np.minimum((u[:, None] >= cum).sum(axis=1), 5)
+
+            guaranteed = avail & (cnt + 1 == self.guarantee5Count)
+            rarity = np.where(guaranteed, np.maximum(rarity, 4), rarity)
+            cnt += 1
+            avail &= rarity < 4
+
+            if trackChars:
+                for r, (group, groupTargetBits, groupUpIndex) in groups.items():
+                    if not len(hitIdx := np.flatnonzero(rarity == r)):
+                        continue
+                    idx = group.table.sampleMany(rng, len(hitIdx))
+                    targetBits, upIndex = groupTargetBits[idx], groupUpIndex[idx]
+
+                    if r in self.upRedirect and pull + 1 >= self.upRedirect[r][0]:
+                        upCount = len(self.upRedirect[r][1])
+                        missing = ((1 << upCount) - 1) & ~gainedUp[r][hitIdx]
+                        chosen = self._chooseMissing(missing, upCount, rng)
+                        redirected = chosen >= 0
+                        upIndex = np.where(redirected, chosen, upIndex)
+                        targetBits = np.where(redirected, upTargetBits[r][np.maximum(chosen, 0)], targetBits)
+
+                    if r == 5 and self.attain6Count:
+                        attained = np.flatnonzero(attainLeft[hitIdx] > 0)
+                        attainIdx = rng.integers(len(group.ids), size=len(attained))
+                        targetBits[attained] = groupTargetBits[attainIdx]
+                        upIndex[attained] = groupUpIndex[attainIdx]
+                        attainLeft[hitIdx[attained]] -= 1
+
+                    if r in gainedUp:
+                        isUp = upIndex >= 0
+                        gainedUp[r][hitIdx[isUp]] |= 1 << upIndex[isUp]
+                    owned[hitIdx] |= targetBits
+
+            rarityCounts[pull] = np.bincount(rarity, minlength=6)
+            first6[(first6 < 0) & (rarity == 5)] = pull + 1
+            first5[(first5 < 0) & (rarity >= 4)] = pull + 1
+            if targetMask:
+                firstTarget[(firstTarget < 0) & (owned == targetMask)] = pull + 1
+
+            is6 = rarity == 5
+            non6 = np.where(is6, 0, non6 + 1)
+            non5 = np.where(is6, 0, np.where(rarity == 4, 1, non5 + 1))
+
+        return SimulationResult(
+            poolId=self.poolId,
+            players=players,
+            pulls=pulls,
+            seed=seed,
+            rarityRates=(rarityCounts / max(players, 1)).tolist(),
+            pullsToFirst6Star=self._histogram(first6, pulls),
+            pullsToFirst5Star=self._histogram(first5, pulls),
+            pullsToTarget=self._histogram(firstTarget, pulls),
+            targetChars=targetChars,
+        )
+
+    def _rarityWeights(self, non6: np.ndarray, non5: np.ndarray) -> np.ndarray:
+        # 与 GachaService._getRarityHit 保持一致的保底递增与截断
+        weights = np.broadcast_to(self.baseWeights, (len(non6), 6)).copy()
+        base5, base4 = self.baseWeights[5], self.baseWeights[4]
+
+        add6 = np.where(non6 >= self.RIT6_UP_CNT, base5 * (1 + non6 - self.RIT6_UP_CNT), 0.0)
+        weights[:, 5] += np.minimum(add6, 1 - base5)
+
+        cnt51 = np.minimum(1 + non5 - self.RIT5_UP_CNT_1, 5)
+        cnt52 = 1 + non5 - self.RIT5_UP_CNT_2
+        weights[:, 4] += np.where(cnt51 > 0, base4 * cnt51 * 0.25, 0.0)
+        weights[:, 4] += np.where(cnt52 >= 0, base4 * cnt52 * 0.5, 0.0)
+
+        total = np.zeros(len(non6))
+        for i in range(5, -1, -1):
+            weights[:, i] = np.minimum(weights[:, i], 1 - total)
+            total += weights[:, i]
+        weights[:, 2] = np.maximum(0, 1 - weights[:, 3:6].sum(axis=1))
+        return np.maximum(weights, 0)
+
+    @staticmethod
+    def _targetBit(targetChars: list[str], charId: str) -> int:
+        return 1 << targetChars.index(charId) if charId in targetChars else 0
+
+    @staticmethod
+    def _chooseMissing(missing: np.ndarray, upCount: int, rng: np.random.Generator) -> np.ndarray:
+        # 在各玩家尚未获得的 up 角色中均匀选择一个, 全部已获得时为 -1
+        counts = sum((missing >> j) & 1 for j in range(upCount))
+        pick = (rng.random(len(missing)) * counts).astype(np.int64)
+        chosen = np.full(len(missing), -1, dtype=np.int64)
+        seen = np.zeros(len(missing), dtype=np.int64)
+        for j in range(upCount):
+            isMissing = ((missing >> j) & 1).astype(bool)
+            chosen = np.where(isMissing & (seen == pick), j, chosen)
+            seen += isMissing
+        return chosen
+
+    @staticmethod
+    def _histogram(firstHit: np.ndarray, pulls: int) -> list[int]:
+        # 下标 0 记录在模拟范围内未达成的玩家数
+        return np.bincount(np.maximum(firstHit, 0), minlength=pulls + 1).tolist()
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of a gacha pool")
+    parser.add_argument("poolId")
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--pulls", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--target", action="append", default=None)
+    args = parser.parse_args()
+
+    try:
+        simulator = GachaSimulator(args.poolId)
+    except ValueError as e:
+        parser.error(f"{args.poolId}: {e}")
+    result = simulator.run(args.players, args.pulls, args.seed, args.target)
+    print(mscjson.encode(result).decode())
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,121 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import random
+
+from .gachaLogic import GachaService
+from .models import GachaTrackModel
+
+from msgspec import Struct, field, json as mscjson
+
+
+class PoolStatistics(Struct):
+    totalCnt: int = 0
+    rarityCnt: list[int] = field(default_factory=lambda: [0] * 6)
+    gain5Star: dict[str, int] = field(default_factory=dict)
+    gain6Star: dict[str, int] = field(default_factory=dict)
+
+    def merge(self, other: "PoolStatistics") -> None:
+        self.totalCnt += other.totalCnt
+        self.rarityCnt = [a + b for a, b in zip(self.rarityCnt, other.rarityCnt)]
+        for mine, theirs in ((self.gain5Star, other.gain5Star), (self.gain6Star, other.gain6Star)):
+            for charId, cnt in theirs.items():
+                mine[charId] = mine.get(charId, 0) + cnt
+
+
+class TrackStatistics(Struct):
+    players: int = 0
+    pool: dict[str, PoolStatistics] = field(default_factory=dict)
+
+    def add(self, track: GachaTrackModel) -> None:
+        self.players += 1
+        for poolId, state in track.pool.items():
+            stats = PoolStatistics(totalCnt=state.totalCnt)
+            stats.rarityCnt = [state.history.rarities.count(r) for r in range(6)]
+            for charId in state.gain5Star:
+                stats.gain5Star[charId] = stats.gain5Star.get(charId, 0) + 1
+            for charId in state.gain6Star:
+                stats.gain6Star[charId] = stats.gain6Star.get(charId, 0) + 1
+            self.pool.setdefault(poolId, PoolStatistics()).merge(stats)
+
+    def merge(self, other: "TrackStatistics") -> None:
+        self.players += other.players
+        for poolId, stats in other.pool.items():
+            self.pool.setdefault(poolId, PoolStatistics()).merge(stats)
+
+    def normalize(self) -> None:
+        # 合并顺序会影响 dict 的插入顺序, 排序后保证编码结果逐字节一致
+        self.pool = dict(sorted(self.pool.items()))
+        for stats in self.pool.values():
+            stats.gain5Star = dict(sorted(stats.gain5Star.items()))
+            stats.gain6Star = dict(sorted(stats.gain6Star.items()))
+
+
+class SimulationRunner:
+    def __init__(self, poolId: str, players: int, pulls: int, masterSeed: int, workers: int = 1) -> None:
+        self.poolId: str = poolId
+        self.players: int = players
+        self.pulls: int = pulls
+        self.masterSeed: int = masterSeed
+        self.workers: int = max(workers, 1)
+
+    @staticmethod
+    def playerSeed(masterSeed: int, index: int) -> str:
+        # 种子只与玩家序号有关, 与分片方式和进程数无关
+        return f"{masterSeed}:{index}"
+
+    def shards(self) -> list[tuple[int, int]]:
+        size, extra = divmod(self.players, self.workers)
+        shards, start = [], 0
+        for i in range(self.workers):
+            stop = start + size + (i < extra)
+            if stop > start:
+                shards.append((start, stop))
+            start = stop
+        return shards
+
+    def run(self) -> TrackStatistics:
+        shards = self.shards()
+        if self.workers == 1:
+            results = [_runShard(self.poolId, start, stop, self.pulls, self.masterSeed) for start, stop in shards]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(_runShard, self.poolId, start, stop, self.pulls, self.masterSeed)
+                    for start, stop in shards
+                ]
+                results = [f.result() for f in futures]
+
+        merged = TrackStatistics()
+        for stats in results:
+            merged.merge(stats)
+        merged.normalize()
+        return merged
+
+
+def _runShard(poolId: str, start: int, stop: int, pulls: int, masterSeed: int) -> TrackStatistics:
+    stats = TrackStatistics()
+    for index in range(start, stop):
+        tester = GachaService(showLog=False, rng=random.Random(SimulationRunner.playerSeed(masterSeed, index)))
+        result = tester.draw(poolId, pulls)
+        state = tester.track.pool[poolId]
+        for bundle in result:
+            state.history.record(bundle.id_, bundle.rarity)
+        stats.add(tester.track)
+    return stats
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Deterministic multi-process gacha simulation")
+    parser.add_argument("poolId")
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--pulls", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    stats = SimulationRunner(args.poolId, args.players, args.pulls, args.seed, args.workers).run()
+    print(mscjson.encode(stats).decode())
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,307 @@
+from abc import ABC, abstractmethod
+import asyncio
+import os
+from pathlib import Path
+import re
+import struct
+from typing import ClassVar
+
+from .codec import decHook, msgpackEncoder
+from .gachaLogic import GachaService
+from .models import GachaPoolInfo, GachaTrackModel, PlayerGacha, PoolWeightItem
+
+from msgspec import Struct, field, msgpack
+
+
+class PlayerSnapshot(Struct):
+    playerId: str
+    seq: int
+    data: PlayerGacha
+    track: GachaTrackModel
+
+
+class PullLogEntry(Struct, array_like=True, omit_defaults=True):
+    # 一次寻访请求(单抽或十连)的结果, 以及该卡池相关状态在请求结束后的取值
+    seq: int
+    poolId: str
+    results: list[PoolWeightItem]
+    counters: tuple[int, int, int, int]
+    trackCounters: tuple[int, int]
+    normal: PlayerGacha.PlayerGachaPool | None = None
+    single: PlayerGacha.PlayerSingleGacha | None = None
+    attain: PlayerGacha.PlayerAttainGacha | None = None
+    fesClassic: PlayerGacha.PlayerFesClassicGacha | None = None
+    limit: PlayerGacha.PlayerFreeLimitGacha | None = None
+    linkage: dict[str, PlayerGacha.PlayerLinkageGacha] = field(default_factory=dict)
+    newbee: PlayerGacha.PlayerNewbeeGachaPool | None = None
+
+    @classmethod
+    def capture(
+        cls, seq: int, data: PlayerGacha, track: GachaTrackModel, poolId: str, results: list[PoolWeightItem]
+    ) -> "PullLogEntry":
+        state = track.pool[poolId]
+        return cls(
+            seq=seq,
+            poolId=poolId,
+            results=results,
+            counters=(state.init, state.totalCnt, state.non6StarCnt, state.non5StarCnt),
+            trackCounters=(track.nonNormal6StarCnt, track.nonClassic6StarCnt),
+            normal=data.normal.get(poolId),
+            single=data.single.get(poolId),
+            attain=data.attain.get(poolId),
+            fesClassic=data.fesClassic.get(poolId),
+            limit=data.limit.get(poolId),
+            linkage={r: pools[poolId] for r, pools in data.linkage.items() if poolId in pools},
+            newbee=data.newbee if data.newbee.poolId == poolId else None,
+        )
+
+    def apply(self, data: PlayerGacha, track: GachaTrackModel) -> None:
+        poolId = self.poolId
+        state = track.pool.setdefault(poolId, GachaPoolInfo())
+        for charHit in self.results:
+            if charHit.rarity == 4:
+                state.gain5Star.append(charHit.id_)
+            if charHit.rarity == 5:
+                state.gain6Star.append(charHit.id_)
+            state.history.record(charHit.id_, charHit.rarity)
+        state.init, state.totalCnt, state.non6StarCnt, state.non5StarCnt = self.counters
+        track.nonNormal6StarCnt, track.nonClassic6StarCnt = self.trackCounters
+
+        if self.normal is not None:
+            data.normal[poolId] = self.normal
+        if self.single is not None:
+            data.single[poolId] = self.single
+        if self.attain is not None:
+            data.attain[poolId] = self.attain
+        if self.fesClassic is not None:
+            data.fesClassic[poolId] = self.fesClassic
+        if self.limit is not None:
+            data.limit[poolId] = self.limit
+        for ruleId, linkage in self.linkage.items():
+            data.linkage.setdefault(ruleId, {})[poolId] = linkage
+        if self.newbee is not None:
+            data.newbee = self.newbee
+
+
+class PlayerStateStore(ABC):
+    # 玩家 id 会用作文件名, 只接受不含路径分隔符与 `..` 的字符集
+    _playerIdPattern: ClassVar[re.Pattern[str]] = re.compile(r"[0-9A-Za-z_-]{1,64}")
+    _snapshotDecoder: ClassVar[msgpack.Decoder] = msgpack.Decoder(PlayerSnapshot, dec_hook=decHook)
+    _entryDecoder: ClassVar[msgpack.Decoder] = msgpack.Decoder(PullLogEntry, dec_hook=decHook)
+
+    def __init__(self, snapshotEvery: int = 1000) -> None:
+        self.snapshotEvery: int = snapshotEvery
+        self._seq: dict[str, int] = {}
+        self._sinceSnapshot: dict[str, int] = {}
+
+    @abstractmethod
+    async def _writeSnapshot(self, playerId: str, payload: bytes, seq: int) -> None: ...
+
+    @abstractmethod
+    async def _readSnapshot(self, playerId: str) -> bytes | None: ...
+
+    @abstractmethod
+    async def _appendLog(self, playerId: str, payload: bytes) -> None: ...
+
+    @abstractmethod
+    async def _readLog(self, playerId: str) -> list[bytes]: ...
+
+    @classmethod
+    def checkPlayerId(cls, playerId: str) -> None:
+        if not cls._playerIdPattern.fullmatch(playerId):
+            raise ValueError(f"invalid player id: {playerId!r}")
+
+    def start(self) -> None:
+        return
+
+    def forget(self, playerId: str) -> None:
+        # 玩家移出内存后不再保留计数, 下次恢复时从快照与日志重新取得
+        self._seq.pop(playerId, None)
+        self._sinceSnapshot.pop(playerId, None)
+
+    async def flush(self) -> None:
+        return
+
+    async def close(self) -> None:
+        await self.flush()
+
+    async def saveSnapshot(self, playerId: str, data: PlayerGacha, track: GachaTrackModel) -> None:
+        snapshot = PlayerSnapshot(playerId=playerId, seq=self._seq.get(playerId, 0), data=data, track=track)
+        await self._writeSnapshot(playerId, msgpackEncoder.encode(snapshot), snapshot.seq)
+        self._sinceSnapshot[playerId] = 0
+
+    async def recordPulls(
+        self,
+        playerId: str,
+        data: PlayerGacha,
+        track: GachaTrackModel,
+        poolId: str,
+        results: list[PoolWeightItem],
+    ) -> None:
+        seq = self._seq[playerId] = self._seq.get(playerId, 0) + 1
+        entry = PullLogEntry.capture(seq, data, track, poolId, results)
+        await self._appendLog(playerId, msgpackEncoder.encode(entry))
+
+        pulls = self._sinceSnapshot[playerId] = self._sinceSnapshot.get(playerId, 0) + len(results)
+        if pulls >= self.snapshotEvery:
+            await self.saveSnapshot(playerId, data, track)
+
+    async def restore(self, playerId: str) -> PlayerSnapshot | None:
+        if (payload := await self._readSnapshot(playerId)) is not None:
+            snapshot = self._snapshotDecoder.decode(payload)
+        else:
+            snapshot = None
+
+        entries = [self._entryDecoder.decode(raw) for raw in await self._readLog(playerId)]
+        entries = [e for e in entries if snapshot is None or e.seq > snapshot.seq]
+        if snapshot is None:
+            if not entries:
+                return None
+            snapshot = PlayerSnapshot(
+                playerId=playerId, seq=0, data=GachaService.newPlayerData(), track=GachaTrackModel()
+            )
+
+        for entry in entries:
+            entry.apply(snapshot.data, snapshot.track)
+            snapshot.seq = entry.seq
+        self._seq[playerId] = snapshot.seq
+        self._sinceSnapshot[playerId] = sum(len(e.results) for e in entries)
+        return snapshot
+
+
+class MemoryStateStore(PlayerStateStore):
+    def __init__(self, snapshotEvery: int = 1000) -> None:
+        super().__init__(snapshotEvery)
+        self.snapshots: dict[str, bytes] = {}
+        self.logs: dict[str, list[bytes]] = {}
+
+    async def _writeSnapshot(self, playerId: str, payload: bytes, seq: int) -> None:
+        self.snapshots[playerId] = payload
+        if logs := self.logs.get(playerId):
+            self.logs[playerId] = [raw for raw in logs if self._entryDecoder.decode(raw).seq > seq]
+
+    async def _readSnapshot(self, playerId: str) -> bytes | None:
+        return self.snapshots.get(playerId)
+
+    async def _appendLog(self, playerId: str, payload: bytes) -> None:
+        self.logs.setdefault(playerId, []).append(payload)
+
+    async def _readLog(self, playerId: str) -> list[bytes]:
+        return list(self.logs.get(playerId, ()))
+
+
+class FileStateStore(PlayerStateStore):
+    # 日志记录格式: 4 字节小端长度 + msgpack 负载; 结尾不完整的记录视为崩溃残留并忽略
+    _header: ClassVar[struct.Struct] = struct.Struct("<I")
+
+    def __init__(
+        self,
+        root: Path,
+        snapshotEvery: int = 1000,
+        flushBatch: int = 256,
+        flushInterval: float = 0.05,
+    ) -> None:
+        super().__init__(snapshotEvery)
+        self.root: Path = root
+        self.flushBatch: int = flushBatch
+        self.flushInterval: float = flushInterval
+        (root / "snapshots").mkdir(parents=True, exist_ok=True)
+        (root / "logs").mkdir(parents=True, exist_ok=True)
+
+        self._pending: dict[str, list[bytes]] = {}
+        self._pendingCnt: int = 0
+        self._flushLock: asyncio.Lock = asyncio.Lock()
+        self._flushTask: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._flushTask is None:
+            self._flushTask = asyncio.create_task(self._flushLoop())
+
+    async def close(self) -> None:
+        if self._flushTask is not None:
+            self._flushTask.cancel()
+            self._flushTask = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self._flushLock:
+            await self._flushLocked()
+
+    async def _flushLocked(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending, self._pendingCnt = self._pending, {}, 0
+        await asyncio.to_thread(self._writeBatch, pending)
+
+    async def _flushLoop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flushInterval)
+            await self.flush()
+
+    def _snapshotPath(self, playerId: str) -> Path:
+        self.checkPlayerId(playerId)
+        return self.root / "snapshots" / f"{playerId}.msgpack"
+
+    def _logPath(self, playerId: str) -> Path:
+        self.checkPlayerId(playerId)
+        return self.root / "logs" / f"{playerId}.log"
+
+    def _writeBatch(self, pending: dict[str, list[bytes]]) -> None:
+        for playerId, records in pending.items():
+            with self._logPath(playerId).open("ab") as f:
+                f.write(b"".join(records))
+                f.flush()
+                os.fsync(f.fileno())
+
+    async def _appendLog(self, playerId: str, payload: bytes) -> None:
+        self._pending.setdefault(playerId, []).append(self._header.pack(len(payload)) + payload)
+        self._pendingCnt += 1
+        if self._pendingCnt >= self.flushBatch:
+            await self.flush()
+
+    async def _readLog(self, playerId: str) -> list[bytes]:
+        await self.flush()
+        if not (path := self._logPath(playerId)).exists():
+            return []
+        return self._splitRecords(await asyncio.to_thread(path.read_bytes))
+
+    def _splitRecords(self, raw: bytes) -> list[bytes]:
+        records, offset, size = [], 0, self._header.size
+        while offset + size <= len(raw):
+            (length,) = self._header.unpack_from(raw, offset)
+            if offset + size + length > len(raw):
+                break
+            records.append(raw[offset + size:offset + size + length])
+            offset += size + length
+        return records
+
+    def _truncateLog(self, playerId: str, seq: int) -> None:
+        if not (path := self._logPath(playerId)).exists():
+            return
+        kept = [raw for raw in self._splitRecords(path.read_bytes()) if self._entryDecoder.decode(raw).seq > seq]
+        if not kept:
+            path.unlink()
+            return
+        self._replaceFile(path, b"".join(self._header.pack(len(raw)) + raw for raw in kept))
+
+    async def _writeSnapshot(self, playerId: str, payload: bytes, seq: int) -> None:
+        # 快照先落盘再截断日志; 中途崩溃时, 回放会按 seq 跳过快照已包含的记录.
+        # 快照编码后到获得锁之前可能已有新记录写入, 因此只丢弃 seq 不大于快照的记录
+        async with self._flushLock:
+            await self._flushLocked()
+            await asyncio.to_thread(self._replaceFile, self._snapshotPath(playerId), payload)
+            await asyncio.to_thread(self._truncateLog, playerId, seq)
+
+    async def _readSnapshot(self, playerId: str) -> bytes | None:
+        if not (path := self._snapshotPath(playerId)).exists():
+            return None
+        return await asyncio.to_thread(path.read_bytes)
+
+    @staticmethod
+    def _replaceFile(path: Path, payload: bytes) -> None:
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
@@ -0,0 +1,272 @@
+import argparse
+from collections.abc import Iterator
+from contextlib import contextmanager
+import gc
+import hashlib
+from pathlib import Path
+import time
+from typing import ClassVar
+
+from .aliasTable import AliasTable
+from .models import (
+    GachaDetailInfo,
+    GachaDetailTable,
+    GachaPoolClientData,
+    GachaTable,
+    LazyDetails,
+    NewbeeGachaPoolClientData,
+    PoolCatalogItem,
+    RawGachaDetailTable,
+)
+from .poolGenerator import CompiledPool, CompiledPoolGroup, PoolGenerator
+from .rarityTable import RarityTable, RarityTableCache
+
+from loguru import logger
+from msgspec import DecodeError, Raw, Struct, ValidationError, json as mscjson, msgpack, structs
+
+
+class ArtifactGroup(Struct, array_like=True):
+    chars: tuple[int, ...]
+    weights: tuple[float, ...]
+    prob: tuple[float, ...]
+    alias: tuple[int, ...]
+
+
+class TableArtifact(Struct, array_like=True):
+    # 头部(格式版本、源表内容哈希、源文件大小与修改时间)在前, 各载荷以 Raw 保留, 校验通过后才解码
+    # 针对的是热启动: 单看解码比直接解码 JSON 慢(需重建候选组的元组与浮点数对象), 收益在于省去各卡池的编译与稀有度表预热
+    FORMAT: ClassVar[int] = 1
+
+    format: int
+    version: str
+    sources: tuple[tuple[int, int], tuple[int, int]]
+    excel: Raw
+    server: Raw
+    # (角色 id, 稀有度) 表与去重后的候选组; 卡池按下标引用候选组, -1 表示该稀有度没有候选
+    chars: Raw
+    groups: Raw
+    pools: Raw
+    rarity: Raw
+
+
+class ArtifactTables(Struct):
+    version: str
+    excel: GachaTable
+    server: GachaDetailTable
+    pools: dict[str, CompiledPool]
+    rarity: list[RarityTable]
+    decodeTimeNs: int
+
+
+_artifactDecoder = msgpack.Decoder(TableArtifact)
+_excelDecoder = msgpack.Decoder(GachaTable)
+_serverDecoder = msgpack.Decoder(GachaDetailTable)
+_rawServerDecoder = msgpack.Decoder(RawGachaDetailTable)
+_detailDecoder = msgpack.Decoder(GachaDetailInfo)
+_charsDecoder = msgpack.Decoder(list[tuple[str, int]])
+_groupsDecoder = msgpack.Decoder(list[ArtifactGroup])
+_poolsDecoder = msgpack.Decoder(dict[str, tuple[int, ...]])
+_rarityDecoder = msgpack.Decoder(list[RarityTable])
+
+
+def sourceVersion(excelRaw: bytes, serverRaw: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(excelRaw)
+    digest.update(serverRaw)
+    return digest.hexdigest()
+
+
+def sourceStamp(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def runtimeDetail(detail: GachaDetailInfo) -> GachaDetailInfo:
+    # gachaObjList/gachaObjGroups 只用于客户端展示, 抽卡不读取
+    return structs.replace(detail, gachaObjList=[], gachaObjGroups=None)
+
+
+def runtimePoolClient(poolClient: GachaPoolClientData) -> GachaPoolClientData:
+    # 名称、简介与配色只用于客户端展示; 规则、保底、开放时间与 dynMeta 保留
+    return structs.replace(
+        poolClient,
+        CDPrimColor=None,
+        CDSecColor=None,
+        gachaPoolDetail=None,
+        gachaPoolName="",
+        gachaPoolSummary="",
+        LMTGSID=None,
+    )
+
+
+def runtimeNewbeePoolClient(poolClient: NewbeeGachaPoolClientData) -> NewbeeGachaPoolClientData:
+    return structs.replace(poolClient, gachaPoolName="", gachaPoolDetail="")
+
+
+def runtimeExcel(excel: GachaTable) -> GachaTable:
+    # 抽卡只读取卡池列表、新手卡池列表与轮播开放时间; 公开招募、标签与兑换道具等表置空
+    return structs.replace(
+        excel,
+        gachaTags=[],
+        dicRecruit6StarHint=None,
+        freeGacha=[],
+        gachaPoolClient=[runtimePoolClient(p) for p in excel.gachaPoolClient],
+        limitTenGachaItem=[],
+        linkageTenGachaItem=[],
+        newbeeGachaPoolClient=[runtimeNewbeePoolClient(p) for p in excel.newbeeGachaPoolClient],
+        recruitDetail="",
+        recruitRarityTable={},
+        specialRecruitPool=[],
+        specialTagRarityTable={},
+        potentialMats=None,
+        classicPotentialMats=None,
+    )
+
+
+def buildArtifact(excelPath: Path, serverPath: Path) -> bytes:
+    excelRaw, serverRaw = excelPath.read_bytes(), serverPath.read_bytes()
+    excel = runtimeExcel(mscjson.decode(excelRaw, type=GachaTable))
+    server = mscjson.decode(serverRaw, type=GachaDetailTable)
+
+    server = GachaDetailTable(details={poolId: runtimeDetail(detail) for poolId, detail in server.details.items()})
+
+    charIndex: dict[tuple[str, int], int] = {}
+    groupIndex: dict[tuple, int] = {}
+    groups: list[ArtifactGroup] = []
+    pools: dict[str, tuple[int, ...]] = {}
+    for poolId, detail in server.details.items():
+        refs = []
+        for rarity, group in enumerate(PoolGenerator.compile(detail).groups):
+            if group is None:
+                refs.append(-1)
+                continue
+            chars = tuple(charIndex.setdefault((charId, rarity), len(charIndex)) for charId in group.ids)
+            key = (chars, group.weights, group.table.prob, group.table.alias)
+            if (ref := groupIndex.get(key)) is None:
+                ref = groupIndex[key] = len(groups)
+                groups.append(ArtifactGroup(chars, group.weights, group.table.prob, group.table.alias))
+            refs.append(ref)
+        pools[poolId] = tuple(refs)
+
+    rarityTables = RarityTableCache(server)
+    rarityTables.warm()
+
+    excelStamp, serverStamp = sourceStamp(excelPath), sourceStamp(serverPath)
+    assert excelStamp is not None and serverStamp is not None
+    return msgpack.encode(
+        TableArtifact(
+            format=TableArtifact.FORMAT,
+            version=sourceVersion(excelRaw, serverRaw),
+            sources=(excelStamp, serverStamp),
+            excel=Raw(msgpack.encode(excel)),
+            server=Raw(msgpack.encode(server)),
+            chars=Raw(msgpack.encode(list(charIndex))),
+            groups=Raw(msgpack.encode(groups)),
+            pools=Raw(msgpack.encode(pools)),
+            rarity=Raw(msgpack.encode(rarityTables.tables())),
+        )
+    )
+
+
+def readArtifact(path: Path, excelPath: Path, serverPath: Path, lazy: bool = False) -> ArtifactTables | None:
+    # 预处理文件缺失、格式不符或与 JSON 源表不一致时返回 None, 由调用方回退到 JSON
+    if not path.exists():
+        return None
+    try:
+        artifact = _artifactDecoder.decode(path.read_bytes())
+    except (DecodeError, ValidationError) as e:
+        logger.warning(f"ignoring unreadable gacha table artifact {path}: {e}")
+        return None
+    if artifact.format != TableArtifact.FORMAT:
+        logger.warning(f"ignoring gacha table artifact {path} with format {artifact.format}")
+        return None
+    if not _isCurrent(artifact, excelPath, serverPath):
+        logger.warning(f"gacha table artifact {path} is stale, loading the JSON tables instead")
+        return None
+
+    start = time.perf_counter_ns()
+    with _gcPaused():
+        excel = _excelDecoder.decode(artifact.excel)
+        if lazy:
+            server = GachaDetailTable(LazyDetails(_rawServerDecoder.decode(artifact.server).details, _detailDecoder.decode))
+        else:
+            server = _serverDecoder.decode(artifact.server)
+        chars = _charsDecoder.decode(artifact.chars)
+        groups = _compiledGroups(_groupsDecoder.decode(artifact.groups), chars)
+        pools = {
+            poolId: CompiledPool(groups=tuple(groups[i] if i >= 0 else None for i in refs))
+            for poolId, refs in _poolsDecoder.decode(artifact.pools).items()
+        }
+        rarity = _rarityDecoder.decode(artifact.rarity)
+    return ArtifactTables(
+        version=artifact.version,
+        excel=excel,
+        server=server,
+        pools=pools,
+        rarity=rarity,
+        decodeTimeNs=time.perf_counter_ns() - start,
+    )
+
+
+def _isCurrent(artifact: TableArtifact, excelPath: Path, serverPath: Path) -> bool:
+    stamps = (sourceStamp(excelPath), sourceStamp(serverPath))
+    # 只部署预处理文件时没有源表可比对
+    if stamps == (None, None) or stamps == artifact.sources:
+        return True
+    if None in stamps:
+        return False
+    # 修改时间变化(如重新检出)但内容未变时仍可使用
+    return sourceVersion(excelPath.read_bytes(), serverPath.read_bytes()) == artifact.version
+
+
+def _compiledGroups(groups: list[ArtifactGroup], chars: list[tuple[str, int]]) -> list[CompiledPoolGroup]:
+    # 相同的候选组在各卡池间共用同一个只读对象
+    items = [PoolCatalogItem.char(charId, rarity) for charId, rarity in chars]
+    ids = [charId for charId, _ in chars]
+    return [
+        CompiledPoolGroup(
+            weights=group.weights,
+            items=tuple(map(items.__getitem__, group.chars)),
+            table=AliasTable(prob=group.prob, alias=group.alias),
+            ids=(groupIds := tuple(map(ids.__getitem__, group.chars))),
+            idSet=frozenset(groupIds),
+        )
+        for group in groups
+    ]
+
+
+@contextmanager
+def _gcPaused() -> Iterator[None]:
+    # 解码产生大量存活对象, 期间的分代回收没有可回收的内容
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Build the compact runtime artifact from the JSON gacha tables")
+    parser.add_argument("--excel", type=Path, default=Path("gacha_table.json"))
+    parser.add_argument("--server", type=Path, default=Path("gacha_detail_table.json"))
+    parser.add_argument("--output", type=Path, default=Path("gacha_tables.msgpack"))
+    args = parser.parse_args()
+
+    payload = buildArtifact(args.excel, args.server)
+    args.output.write_bytes(payload)
+    tables = readArtifact(args.output, args.excel, args.server)
+    assert tables is not None
+    sourceSize = args.excel.stat().st_size + args.server.stat().st_size
+    print(
+        f"wrote {args.output} ({len(payload)} bytes, {len(payload) / sourceSize:.1%} of the JSON tables), "
+        f"version {tables.version}, {len(tables.pools)} pools, decode {tables.decodeTimeNs / 1e6:.3f}ms"
+    )
+
+
+if __name__ == "__main__":
+    _main()
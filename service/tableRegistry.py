@@ -0,0 +1,177 @@
+from pathlib import Path
+import sys
+from threading import Lock
+import time
+from typing import Any, ClassVar
+
+from .gachaRules import PoolRuleCache
+from .models import GachaDetailInfo, GachaDetailTable, GachaTable, LazyDetails, RawGachaDetailTable
+from .poolGenerator import CompiledPoolCache
+from .rarityTable import RarityTableCache
+from .tableArtifact import readArtifact, sourceVersion
+
+from msgspec import Raw, Struct, json as mscjson
+
+
+class GachaTableRegistry:
+    __slots__ = ("Excel", "Server", "pools", "rarity", "rules", "version", "source", "decodeTimeNs", "_residentSize", "__weakref__")
+
+    excelPath: ClassVar[Path] = Path("gacha_table.json")
+    serverPath: ClassVar[Path] = Path("gacha_detail_table.json")
+    # 由 `python -m service.tableArtifact` 生成; 缺失或与源表不一致时读取 JSON
+    artifactPath: ClassVar[Path] = Path("gacha_tables.msgpack")
+    # 卡池详情按需解码, 适合只开放少数卡池的进程
+    lazyDetails: ClassVar[bool] = False
+
+    _excelDecoder: ClassVar[mscjson.Decoder] = mscjson.Decoder(GachaTable)
+    _serverDecoder: ClassVar[mscjson.Decoder] = mscjson.Decoder(GachaDetailTable)
+    _rawServerDecoder: ClassVar[mscjson.Decoder] = mscjson.Decoder(RawGachaDetailTable)
+    _detailDecoder: ClassVar[mscjson.Decoder] = mscjson.Decoder(GachaDetailInfo)
+    _shared: ClassVar["GachaTableRegistry | None"] = None
+    _lock: ClassVar[Lock] = Lock()
+
+    Excel: GachaTable
+    Server: GachaDetailTable
+    pools: CompiledPoolCache
+    rarity: RarityTableCache
+    rules: PoolRuleCache
+    version: str
+    source: str
+    decodeTimeNs: int
+    _residentSize: int | None
+
+    def __init__(
+        self,
+        excel: GachaTable,
+        server: GachaDetailTable,
+        decodeTimeNs: int = 0,
+        version: str = "",
+        source: str = "json",
+    ) -> None:
+        object.__setattr__(self, "Excel", excel)
+        object.__setattr__(self, "Server", server)
+        object.__setattr__(self, "pools", CompiledPoolCache(server))
+        object.__setattr__(self, "rarity", RarityTableCache(server))
+        object.__setattr__(self, "rules", PoolRuleCache(excel))
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "source", source)
+        object.__setattr__(self, "decodeTimeNs", decodeTimeNs)
+        object.__setattr__(self, "_residentSize", None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("GachaTableRegistry is immutable")
+
+    @classmethod
+    def shared(cls) -> "GachaTableRegistry":
+        if (registry := cls._shared) is None:
+            with cls._lock:
+                if (registry := cls._shared) is None:
+                    registry = cls._shared = cls.load(artifactPath=cls.artifactPath)
+        return registry
+
+    @classmethod
+    def swap(cls, registry: "GachaTableRegistry") -> "GachaTableRegistry | None":
+        # 只替换引用; 已取得旧注册表的请求继续使用旧版本直到结束
+        with cls._lock:
+            previous, cls._shared = cls._shared, registry
+        return previous
+
+    @classmethod
+    def load(
+        cls,
+        excelPath: Path | None = None,
+        serverPath: Path | None = None,
+        artifactPath: Path | None = None,
+        lazy: bool | None = None,
+    ) -> "GachaTableRegistry":
+        excelPath, serverPath = excelPath or cls.excelPath, serverPath or cls.serverPath
+        lazy = cls.lazyDetails if lazy is None else lazy
+        if artifactPath is not None and (tables := readArtifact(artifactPath, excelPath, serverPath, lazy)) is not None:
+            registry = cls(tables.excel, tables.server, tables.decodeTimeNs, tables.version, "artifact")
+            registry.pools.preload(tables.pools)
+            registry.rarity.preload(tables.rarity)
+        else:
+            excelRaw = excelPath.read_bytes()
+            serverRaw = serverPath.read_bytes()
+
+            start = time.perf_counter_ns()
+            excel = cls._excelDecoder.decode(excelRaw)
+            if lazy:
+                server = GachaDetailTable(LazyDetails(cls._rawServerDecoder.decode(serverRaw).details, cls._detailDecoder.decode))
+            else:
+                server = cls._serverDecoder.decode(serverRaw)
+            registry = cls(excel, server, time.perf_counter_ns() - start, cls.contentVersion(excelRaw, serverRaw))
+        # 预热稀有度表需要读取每个卡池的详情, 按需解码时留到首次抽卡
+        if not lazy:
+            registry.rarity.warm()
+        return registry
+
+    @staticmethod
+    def contentVersion(excelRaw: bytes, serverRaw: bytes) -> str:
+        return sourceVersion(excelRaw, serverRaw)
+
+    def warm(self) -> None:
+        self.rarity.warm()
+        self.pools.warm()
+
+    @property
+    def lazy(self) -> bool:
+        return isinstance(self.Server.details, LazyDetails)
+
+    @property
+    def poolIds(self) -> frozenset[str]:
+        # 有服务端详情的卡池才能抽取
+        return frozenset(self.Server.details)
+
+    @property
+    def decodeTime(self) -> float:
+        return self.decodeTimeNs / 1e9
+
+    @property
+    def residentSize(self) -> int:
+        # 按需解码时占用随访问增长, 每次重新统计
+        if self.lazy:
+            return _deepSizeOf((self.Excel, self.Server))
+        if (size := self._residentSize) is None:
+            size = _deepSizeOf((self.Excel, self.Server))
+            object.__setattr__(self, "_residentSize", size)
+        return size
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "decodeTimeMs": round(self.decodeTimeNs / 1e6, 3),
+            "residentSize": self.residentSize,
+            "gachaPoolClient": len(self.Excel.gachaPoolClient),
+            "details": len(self.Server.details),
+            "decodedDetails": details.decodedCount if isinstance(details := self.Server.details, LazyDetails) else len(details),
+            "compiledPools": len(self.pools),
+            "rarityTables": len(self.rarity),
+        }
+
+
+def _deepSizeOf(root: object) -> int:
+    seen: set[int] = set()
+    stack = [root]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        # Raw 的 sys.getsizeof 不可靠, 按片段长度计
+        if isinstance(obj, Raw):
+            size += len(obj)
+            continue
+        size += sys.getsizeof(obj)
+        if isinstance(obj, LazyDetails):
+            stack.extend((obj._raw, obj._decoded))
+        elif isinstance(obj, Struct):
+            stack.extend(getattr(obj, f) for f in obj.__struct_fields__)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, list | tuple | set | frozenset):
+            stack.extend(obj)
+    return size
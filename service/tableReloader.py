@@ -0,0 +1,136 @@
+import asyncio
+from collections.abc import Callable, Mapping
+from pathlib import Path
+import time
+
+from .models import GachaDetailInfo, GachaDetailTable, LazyDetails
+from .tableArtifact import runtimeDetail, runtimePoolClient, sourceStamp
+from .tableRegistry import GachaTableRegistry
+
+from loguru import logger
+from msgspec import Struct
+
+type FileStamp = tuple[tuple[int, int] | None, ...]
+
+
+class ReloadReport(Struct):
+    version: str
+    previousVersion: str
+    loadTimeMs: float
+    swapTimeNs: int
+    added: list[str]
+    removed: list[str]
+    changed: list[str]
+
+
+class TableReloader:
+    # 轮询表文件的修改时间与大小; 变化后在工作线程中解码并预热新表, 成功后才替换共享注册表,
+    # 失败时保留旧表继续服务
+    def __init__(
+        self,
+        excelPath: Path | None = None,
+        serverPath: Path | None = None,
+        interval: float = 1.0,
+        onReload: Callable[[ReloadReport], None] | None = None,
+    ) -> None:
+        self.excelPath: Path = excelPath or GachaTableRegistry.excelPath
+        self.serverPath: Path = serverPath or GachaTableRegistry.serverPath
+        self.interval: float = interval
+        self.onReload: Callable[[ReloadReport], None] | None = onReload
+        self.lastReport: ReloadReport | None = None
+        self._stamp: FileStamp = self._fileStamp()
+        self._watchTask: asyncio.Task | None = None
+        self._reloadLock: asyncio.Lock = asyncio.Lock()
+
+    def start(self) -> None:
+        if self._watchTask is None:
+            self._watchTask = asyncio.create_task(self._watchLoop())
+
+    async def close(self) -> None:
+        if self._watchTask is not None:
+            self._watchTask.cancel()
+            self._watchTask = None
+
+    async def reload(self) -> ReloadReport:
+        async with self._reloadLock:
+            previous = GachaTableRegistry.shared()
+            start = time.perf_counter_ns()
+            registry, diff = await asyncio.to_thread(self._prepare, previous)
+            loadTimeNs = time.perf_counter_ns() - start
+
+            start = time.perf_counter_ns()
+            GachaTableRegistry.swap(registry)
+            swapTimeNs = time.perf_counter_ns() - start
+
+            report = self.lastReport = ReloadReport(
+                version=registry.version,
+                previousVersion=previous.version,
+                loadTimeMs=round(loadTimeNs / 1e6, 3),
+                swapTimeNs=swapTimeNs,
+                **diff,
+            )
+        logger.info(
+            f"gacha tables reloaded {report.previousVersion} -> {report.version} "
+            f"(load {report.loadTimeMs}ms, swap {report.swapTimeNs}ns, "
+            f"+{len(report.added)} -{len(report.removed)} ~{len(report.changed)} pools)"
+        )
+        if self.onReload is not None:
+            self.onReload(report)
+        return report
+
+    def _prepare(self, previous: GachaTableRegistry) -> tuple[GachaTableRegistry, dict[str, list[str]]]:
+        registry = GachaTableRegistry.load(self.excelPath, self.serverPath)
+        if not registry.lazy:
+            registry.warm()
+
+        oldIds, newIds = previous.poolIds, registry.poolIds
+        changed = [
+            poolId
+            for poolId in oldIds & newIds
+            if self._detailChanged(previous.Server, registry.Server, poolId)
+            or self._poolClientChanged(previous, registry, poolId)
+        ]
+        return registry, {
+            "added": sorted(newIds - oldIds),
+            "removed": sorted(oldIds - newIds),
+            "changed": sorted(changed),
+        }
+
+    @staticmethod
+    def _detailChanged(previous: GachaDetailTable, current: GachaDetailTable, poolId: str) -> bool:
+        old, new = previous.details, current.details
+        if isinstance(old, LazyDetails) and isinstance(new, LazyDetails):
+            # 片段相同则内容相同; 不同时(如来源编码不同)再解码比对, 比对结果不写入按需解码的缓存
+            if (raw := old.raw(poolId)) is not None and raw == new.raw(poolId):
+                return False
+        return TableReloader._peek(old, poolId) != TableReloader._peek(new, poolId)
+
+    @staticmethod
+    def _poolClientChanged(previous: GachaTableRegistry, current: GachaTableRegistry, poolId: str) -> bool:
+        old = previous.Excel.gachaPoolClientById.get(poolId)
+        new = current.Excel.gachaPoolClientById.get(poolId)
+        if old is None or new is None:
+            return old is not new
+        # 预处理文件不含展示字段, 与 JSON 源表比对时忽略
+        return runtimePoolClient(old) != runtimePoolClient(new)
+
+    @staticmethod
+    def _peek(details: Mapping[str, GachaDetailInfo], poolId: str) -> GachaDetailInfo | None:
+        detail = details.peek(poolId) if isinstance(details, LazyDetails) else details.get(poolId)
+        # 预处理文件不含展示字段, 与 JSON 源表比对时忽略
+        return runtimeDetail(detail) if detail is not None else None
+
+    def _fileStamp(self) -> FileStamp:
+        return sourceStamp(self.excelPath), sourceStamp(self.serverPath)
+
+    async def _watchLoop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if (stamp := self._fileStamp()) == self._stamp or None in stamp:
+                continue
+            # 同一版本文件只尝试一次; 写入未完成导致解码失败时, 写完后修改时间会再次变化
+            self._stamp = stamp
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.warning(f"gacha table reload failed, keeping version {GachaTableRegistry.shared().version}: {e}")